@@ -18,12 +18,90 @@ reverse matching it will look for most appropriate example and
 fill out the details that the user will propose
 """
 
-from flang_parser2 import FlangParser, FlangTextProcessor
-
+import argparse
+import json
+import os
+import sys
+import time
 
-def main(filename):
-    with open(filename) as f:
-        ...
+from flang_parser2 import FlangParser, FlangTextProcessor
+from utils.batch import run_in_pool
+from utils.scan import FileMatcher, walk_files
+
+
+class ScanSummary:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.files = 0
+        self.characters = 0
+        self.matches = 0
+        self.errors = 0
+
+    def add(self, records: list[dict], characters: int) -> None:
+        self.files += 1
+        self.characters += characters
+
+        for record in records:
+            if "error" in record:
+                self.errors += 1
+            else:
+                self.matches += 1
+
+    def __str__(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (
+            f"{self.files} files, {self.matches} matches, {self.errors} errors in {elapsed:.2f}s "
+            f"({self.files / elapsed:.0f} files/s, {self.characters / elapsed / 1e6:.2f}M chars/s)"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Matches the template against every file under the directory and writes
+    the matches as JSON lines:
+
+        python . template.flang.xml src --include "*.py" --exclude .git --lines
+
+    Summary is written to stderr. Exits with status 1 when any file could not be read
+    """
+    arguments = argparse.ArgumentParser(prog="python .")
+    arguments.add_argument("template")
+    arguments.add_argument("directory")
+    arguments.add_argument("--include", action="append", default=[], help="glob of files to match, may repeat")
+    arguments.add_argument("--exclude", action="append", default=[], help="glob of files or directories to skip")
+    arguments.add_argument("--lines", action="store_true", help="match every line instead of whole files")
+    arguments.add_argument("--flat", action="store_true", help="write matches as flat dictionaries")
+    arguments.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    arguments.add_argument("--chunk-size", type=int, default=64, help="files sent to a worker at once")
+    arguments.add_argument("--output", help="write to this file instead of stdout")
+    arguments.add_argument("--progress", action="store_true", help="report progress every second")
+    options = arguments.parse_args(argv)
+
+    matcher = FileMatcher(FlangParser().parse_file(options.template), options.lines, options.flat)
+    files = walk_files(options.directory, options.include, options.exclude)
+    summary = ScanSummary()
+    reported = time.perf_counter()
+    output = open(options.output, "w") if options.output else sys.stdout
+
+    try:
+        for batch_result in run_in_pool(
+            matcher, files, workers=options.jobs, chunksize=options.chunk_size, ordered=False
+        ):
+            scan_result = batch_result.result
+            summary.add(scan_result.records, scan_result.size)
+
+            for record in scan_result.records:
+                output.write(json.dumps(record) + "\n")
+
+            if options.progress and time.perf_counter() - reported >= 1:
+                reported = time.perf_counter()
+                print(summary, file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(summary, file=sys.stderr)
+    return 1 if summary.errors else 0
 
 
 DUMMY_TEST_TEMPLATE = """
@@ -57,4 +135,4 @@ def dummy_main():
 
 
 if __name__ == "__main__":
-    dummy_main()
+    sys.exit(main())
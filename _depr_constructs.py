@@ -4,11 +4,7 @@ import re
 import abc
 from typing import TypeVar
 
-BUILTIN_PATTERNS = {
-    "vname": r"[A-Za-z]\w+",
-    "number": r"-?(([1-9]+\d*)|0)(\.\d*)?",
-    "string": r"((?:\\)\"[^\"]*(?:\\)\")|((?:\\)'[^\']*(?:\\)')",
-}
+from utils.patterns import BUILTIN_PATTERNS
 
 T = TypeVar("T")
 
@@ -0,0 +1,78 @@
+"""
+Runs the benchmark suite and compares it with the baseline recorded on this host:
+
+    python -m benchmarks
+    python -m benchmarks --scenario wide --scenario deep
+    python -m benchmarks --save-baseline
+    python -m benchmarks --check
+    python -m benchmarks --memory
+
+Baselines are stored per host, as timings of different machines cannot be compared,
+record one with --save-baseline first. With --check, exits with status 1 when any phase
+regressed against the baseline of this host. With --memory, bytes retained per tree
+element, construct and match node are reported instead
+"""
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.suite import (
+    SCENARIOS,
+    run_suite,
+    to_json,
+    load_baseline,
+    save_baseline,
+    find_regressions,
+    format_report,
+)
+from benchmarks.memory import measure_memory, format_memory_report
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def main(argv: list[str] | None = None) -> int:
+    arguments = argparse.ArgumentParser(prog="python -m benchmarks")
+    arguments.add_argument("--scenario", action="append", choices=sorted(SCENARIOS))
+    arguments.add_argument("--repeat", type=int, default=3)
+    arguments.add_argument("--corpus-size", type=int, default=200)
+    arguments.add_argument("--baseline", default=DEFAULT_BASELINE)
+    arguments.add_argument("--tolerance", type=float, default=0.25)
+    arguments.add_argument("--min-seconds", type=float, default=0.005, help="ignore smaller slowdowns")
+    arguments.add_argument("--save-baseline", action="store_true")
+    arguments.add_argument("--check", action="store_true", help="exit with status 1 on regressions")
+    arguments.add_argument("--json", help="write results to this file")
+    arguments.add_argument("--memory", action="store_true", help="report memory per object instead of time")
+    options = arguments.parse_args(argv)
+
+    if options.memory:
+        scenarios = options.scenario or SCENARIOS
+        memory = {name: measure_memory(SCENARIOS[name], options.corpus_size) for name in scenarios}
+        print(format_memory_report(memory))
+        return 0
+
+    results = run_suite(options.scenario, corpus_size=options.corpus_size, repeat=options.repeat)
+    baseline = load_baseline(options.baseline)
+    print(format_report(results, baseline))
+
+    if options.json:
+        with open(options.json, "w") as f:
+            json.dump(to_json(results), f, indent=2)
+
+    if options.save_baseline:
+        save_baseline(options.baseline, results)
+        return 0
+
+    if not baseline:
+        print("\nNo baseline recorded on this host, run with --save-baseline to record one")
+        return 0
+
+    if regressions := find_regressions(results, baseline, options.tolerance, options.min_seconds):
+        print("\nRegressions:", *regressions, sep="\n  ")
+        return 1 if options.check else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
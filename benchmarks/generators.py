@@ -0,0 +1,96 @@
+"""
+Synthetic templates of controlled shape and corpora of samples matching them
+"""
+from __future__ import annotations
+import dataclasses
+import random
+import string
+
+
+@dataclasses.dataclass(frozen=True)
+class TemplateShape:
+    statements: int = 10  # statements in sequence in the root component
+    depth: int = 1  # components nested around every statement
+    fan_out: int = 1  # shared definitions referenced by the statements
+    choice_width: int = 2  # alternatives of the choice in every statement
+
+
+def generate_template(shape: TemplateShape) -> str:
+    """
+    Every statement looks like "a<alternative>_<number> kw<definition> <word>;"
+    """
+    parts = ['<component name="root">']
+
+    for definition in range(shape.fan_out):
+        parts.append(
+            f'<component name="d{definition}" type="definition">'
+            f'kw{definition} <predicate name="v" pattern="[a-z]+"/></component>'
+        )
+
+    for statement in range(shape.statements):
+        parts.append(f'<component name="s{statement}">')
+        parts.extend(f'<component name="n{level}">' for level in range(shape.depth))
+        parts.append('<choice name="alt">')
+        parts.extend(
+            f'<component name="a{alternative}">a{alternative}_<predicate name="v" pattern="\\d+"/></component>'
+            for alternative in range(shape.choice_width)
+        )
+        parts.append("</choice>")
+        parts.append(f' <use ref=".d{statement % shape.fan_out}"/>')
+        parts.extend("</component>" for _ in range(shape.depth))
+        parts.append(";</component>")
+
+    parts.append("</component>")
+    return "".join(parts)
+
+
+def generate_surface_template(shape: TemplateShape) -> str:
+    """
+    The same template as generate_template, written in the {% %} surface syntax
+    """
+    parts = ["{% defc ^name root"]
+
+    for definition in range(shape.fan_out):
+        parts.append(f'{{% defc ^name d{definition} ^type definition kw{definition} {{% defp ^name v "[a-z]+" %}} %}}')
+
+    for statement in range(shape.statements):
+        # one line per statement, whitespace spanning lines is only layout
+        line = [f"{{% defc ^name s{statement} "]
+        line.extend(f"{{% defc ^name n{level} " for level in range(shape.depth))
+        line.append("{% defoc ^name alt ")
+        line.extend(
+            f'{{% defc ^name a{alternative} a{alternative}_{{% defp ^name v "\\d+" %}} %}}'
+            for alternative in range(shape.choice_width)
+        )
+        line.append(f" %}} {{% use .d{statement % shape.fan_out} %}}")
+        line.extend(" %}" for _ in range(shape.depth))
+        line.append(";%}")
+        parts.append("".join(line))
+
+    parts.append("%}")
+    return "\n".join(parts)
+
+
+def generate_sample(shape: TemplateShape, rng: random.Random) -> tuple[str, dict[str, str]]:
+    """
+    Returns text of the sample and the spec generating it
+    """
+    text_parts = []
+    spec = {}
+
+    for statement in range(shape.statements):
+        alternative, definition = rng.randrange(shape.choice_width), statement % shape.fan_out
+        number = str(rng.randrange(10**6))
+        word = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 8)))
+        prefix = ".".join([f"s{statement}", *(f"n{level}" for level in range(shape.depth))])
+
+        text_parts.append(f"a{alternative}_{number} kw{definition} {word};")
+        spec[f"{prefix}.alt.a{alternative}.v"] = number
+        spec[f"{prefix}.d{definition}.v"] = word
+
+    return "".join(text_parts), spec
+
+
+def generate_corpus(shape: TemplateShape, size: int, seed: int = 0) -> list[tuple[str, dict[str, str]]]:
+    rng = random.Random(seed)
+    return [generate_sample(shape, rng) for _ in range(size)]
@@ -0,0 +1,113 @@
+"""
+Memory retained by the objects of every stage, per single object
+"""
+from __future__ import annotations
+import dataclasses
+import gc
+import tracemalloc
+from typing import Callable
+
+from flang_parser2 import FlangParser, FlangXMLParser, FlangStandardParser, FlangTextProcessor
+from benchmarks.generators import TemplateShape, generate_template, generate_corpus
+from utils.dataclasses import FlangMatchObject, IntermediateFlangTreeElement
+from utils.helpers import ATTRIBUTES
+
+
+@dataclasses.dataclass
+class MemoryResult:
+    objects: int
+    retained: int  # bytes still allocated after the stage, while its result is kept
+
+    @property
+    def bytes_per_object(self) -> float:
+        return self.retained / self.objects if self.objects else 0.0
+
+
+def retained_memory(function: Callable[[], any]) -> tuple[any, int]:
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        result = function()
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, after - before
+
+
+def count_elements(element: IntermediateFlangTreeElement) -> int:
+    stack, count = [element], 0
+
+    while stack:
+        element = stack.pop()
+        count += 1
+
+        if isinstance(element.value, list):
+            stack.extend(element.value)
+
+    return count
+
+
+def count_match_nodes(match_object: FlangMatchObject) -> int:
+    stack, count = [match_object], 0
+
+    while stack:
+        match_object = stack.pop()
+        count += 1
+
+        if match_object.spec is not None:
+            stack.extend(match_object.spec.values())
+
+    return count
+
+
+def measure_memory(shape: TemplateShape, corpus_size: int = 200, seed: int = 0) -> dict[str, MemoryResult]:
+    """
+    Every stage is run once before it is measured, so compiled patterns are not counted.
+    Template stage is the memory kept by a loaded template, its intermediate tree
+    is dropped and interned attributes are counted
+    """
+    template = generate_template(shape)
+    corpus = [text for text, _ in generate_corpus(shape, corpus_size, seed)]
+    FlangStandardParser().parse(FlangXMLParser().parse(template))
+    ATTRIBUTES.table.clear()
+
+    flang_object, retained = retained_memory(lambda: FlangStandardParser().parse(FlangXMLParser().parse(template)))
+    results = {"template": MemoryResult(len(flang_object.symbols), retained)}
+
+    tree, retained = retained_memory(lambda: FlangXMLParser().parse(template))
+    results["element"] = MemoryResult(count_elements(tree), retained)
+
+    flang_object, retained = retained_memory(lambda: FlangStandardParser().parse(tree))
+    results["construct"] = MemoryResult(len(flang_object.symbols), retained)
+
+    parser = FlangParser()
+    parser.link(flang_object)
+    parser.perform_optimizations(flang_object)
+    processor = FlangTextProcessor(flang_object)
+    processor.run(corpus[0])  # compiles the matcher
+
+    matches, retained = retained_memory(lambda: [processor.run(text) for text in corpus])
+    results["match_node"] = MemoryResult(sum(count_match_nodes(match) for match in matches), retained)
+
+    processor.tape = True
+    tapes, retained = retained_memory(lambda: [processor.run(text) for text in corpus])
+    results["tape_node"] = MemoryResult(sum(len(tape) for tape in tapes), retained)
+
+    return results
+
+
+def format_memory_report(results: dict[str, dict[str, MemoryResult]]) -> str:
+    lines = [f"{'scenario':<12} {'object':<12} {'count':>10} {'retained':>10} {'bytes each':>11}"]
+
+    for scenario, stages in results.items():
+        for stage, result in stages.items():
+            lines.append(
+                f"{scenario:<12} {stage:<12} {result.objects:>10,} {result.retained / 1024:>8.0f}kB "
+                f"{result.bytes_per_object:>11.0f}"
+            )
+
+    return "\n".join(lines)
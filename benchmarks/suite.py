@@ -0,0 +1,204 @@
+from __future__ import annotations
+import dataclasses
+import json
+import platform
+import time
+import tracemalloc
+from typing import Callable
+
+from flang_parser2 import (
+    FlangParser,
+    FlangXMLParser,
+    FlangStandardParser,
+    FlangTextProcessor,
+    FlangGenerationProcessor,
+)
+from benchmarks.generators import TemplateShape, generate_template, generate_surface_template, generate_corpus
+from utils.surface import FlangSurfaceParser
+import utils.constructs as c
+
+SCENARIOS = {
+    "small": TemplateShape(statements=10, depth=1, fan_out=2, choice_width=2),
+    "wide": TemplateShape(statements=500, depth=1, fan_out=4, choice_width=2),
+    "deep": TemplateShape(statements=20, depth=40, fan_out=2, choice_width=2),
+    "fan_out": TemplateShape(statements=200, depth=1, fan_out=200, choice_width=2),
+    "wide_choice": TemplateShape(statements=20, depth=1, fan_out=2, choice_width=60),
+}
+
+PHASES = ("xml_parse", "surface_parse", "build", "link", "optimize", "match", "generate")
+
+
+class BenchmarkError(RuntimeError):
+    ...
+
+
+@dataclasses.dataclass
+class PhaseResult:
+    seconds: float  # best of the repeats
+    items: int
+    size: int  # characters processed
+    peak_memory: int  # bytes allocated at peak of a single run
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.seconds if self.seconds else float("inf")
+
+    @property
+    def characters_per_second(self) -> float:
+        return self.size / self.seconds if self.seconds else float("inf")
+
+
+def measure(function: Callable[[], any], repeat: int) -> tuple[any, float, int]:
+    """
+    Time is the best of the repeats, memory is measured in a separate run,
+    because tracing allocations slows everything down
+    """
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, best, peak - baseline
+
+
+def run_scenario(
+    shape: TemplateShape, corpus_size: int = 200, repeat: int = 3, seed: int = 0
+) -> dict[str, PhaseResult]:
+    template = generate_template(shape)
+    corpus = generate_corpus(shape, corpus_size, seed)
+    corpus_size_chars = sum(len(text) for text, _ in corpus)
+    parser = FlangParser()
+    results = {}
+
+    tree, seconds, peak = measure(lambda: FlangXMLParser().parse(template), repeat)
+    results["xml_parse"] = PhaseResult(seconds, 1, len(template), peak)
+
+    # the same template in the surface syntax, to compare throughput of the front-ends
+    surface_template = generate_surface_template(shape)
+    _, seconds, peak = measure(lambda: FlangSurfaceParser().parse(surface_template), repeat)
+    results["surface_parse"] = PhaseResult(seconds, 1, len(surface_template), peak)
+
+    flang_object, seconds, peak = measure(lambda: FlangStandardParser().parse(tree), repeat)
+    results["build"] = PhaseResult(seconds, len(flang_object.symbols), len(template), peak)
+
+    references = sum(isinstance(construct, c.FlangReference) for construct in flang_object.symbols.values())
+    _, seconds, peak = measure(lambda: parser.link(flang_object), repeat)
+    results["link"] = PhaseResult(seconds, references, len(template), peak)
+
+    _, seconds, peak = measure(lambda: parser.perform_optimizations(flang_object), repeat)
+    results["optimize"] = PhaseResult(seconds, len(flang_object.symbols), len(template), peak)
+
+    processor = FlangTextProcessor(flang_object)
+    processor.run(corpus[0][0])  # compiles the matcher
+    matches, seconds, peak = measure(lambda: [processor.run(text) for text, _ in corpus], repeat)
+    results["match"] = PhaseResult(seconds, len(corpus), corpus_size_chars, peak)
+
+    if any(match is None or match.end != len(text) for match, (text, _) in zip(matches, corpus)):
+        raise BenchmarkError(f"Generated samples do not match the template of {shape}")
+
+    generator = FlangGenerationProcessor(flang_object)
+    outputs, seconds, peak = measure(lambda: [generator.run(spec) for _, spec in corpus], repeat)
+    results["generate"] = PhaseResult(seconds, len(corpus), corpus_size_chars, peak)
+
+    if outputs != [text for text, _ in corpus]:
+        raise BenchmarkError(f"Generated text differs from the samples of {shape}")
+
+    return results
+
+
+def run_suite(scenarios: list[str] | None = None, **kwargs) -> dict[str, dict[str, PhaseResult]]:
+    return {name: run_scenario(SCENARIOS[name], **kwargs) for name in scenarios or SCENARIOS}
+
+
+def to_json(results: dict[str, dict[str, PhaseResult]]) -> dict:
+    return {
+        scenario: {phase: dataclasses.asdict(result) for phase, result in phases.items()}
+        for scenario, phases in results.items()
+    }
+
+
+def host_key() -> str:
+    """
+    Timings are only comparable on the same machine and interpreter
+    """
+    python_version = ".".join(platform.python_version_tuple()[:2])
+    return f"{platform.node()} {platform.machine()} {platform.python_implementation()} {python_version}"
+
+
+def load_baselines(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def load_baseline(path: str, host: str | None = None) -> dict:
+    """
+    Baseline recorded on the host, empty when there is none
+    """
+    return load_baselines(path).get(host or host_key(), {})
+
+
+def save_baseline(path: str, results: dict[str, dict[str, PhaseResult]], host: str | None = None) -> None:
+    """
+    Stores the results as the baseline of the host, keeping baselines of other hosts.
+    Scenarios which were not run keep their previous numbers
+    """
+    baselines = load_baselines(path)
+    host = host or host_key()
+    baselines[host] = baselines.get(host, {}) | to_json(results)
+
+    with open(path, "w") as f:
+        json.dump(baselines, f, indent=2)
+
+
+def find_regressions(
+    results: dict[str, dict[str, PhaseResult]], baseline: dict, tolerance: float = 0.25, min_seconds: float = 0.005
+) -> list[str]:
+    """
+    Phase regressed when it is slower than the baseline by more than the tolerance.
+    Phases taking a few milliseconds are noisy, they also have to be slower by at least min_seconds
+    """
+    regressions = []
+
+    for scenario, phases in results.items():
+        for phase, result in phases.items():
+            if (stored := baseline.get(scenario, {}).get(phase)) is None:
+                continue
+
+            if result.seconds > stored["seconds"] * (1 + tolerance) + min_seconds:
+                slowdown = result.seconds / stored["seconds"] - 1
+                regressions.append(
+                    f"{scenario}.{phase}: {stored['seconds'] * 1000:.2f}ms -> "
+                    f"{result.seconds * 1000:.2f}ms (+{slowdown:.0%})"
+                )
+
+    return regressions
+
+
+def format_report(results: dict[str, dict[str, PhaseResult]], baseline: dict | None = None) -> str:
+    baseline = baseline or {}
+    lines = [f"{'scenario':<12} {'phase':<13} {'time':>10} {'items/s':>12} {'chars/s':>12} {'peak mem':>10} {'vs base':>8}"]
+
+    for scenario, phases in results.items():
+        for phase, result in phases.items():
+            stored = baseline.get(scenario, {}).get(phase)
+            change = f"{result.seconds / stored['seconds'] - 1:+.0%}" if stored else ""
+            lines.append(
+                f"{scenario:<12} {phase:<13} {result.seconds * 1000:>8.2f}ms {result.items_per_second:>12,.0f} "
+                f"{result.characters_per_second:>12,.0f} {result.peak_memory / 1024:>8.0f}kB {change:>8}"
+            )
+
+    return "\n".join(lines)
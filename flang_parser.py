@@ -1,21 +1,17 @@
 import xml.etree.ElementTree as ET
 from typing import TypeVar
-from collections import defaultdict
 from constructs import FlangConstructsMapping
 from utils_old import interlace
 from tree import FlangComponent, IntermediateFlangTreeElement, FlangASTBuilder
+from utils.samples import FlangSampleStore
+from utils.abstracts import SampleStore
+from utils.patterns import BUILTIN_PATTERNS
 import os
 import logging
 
 T = TypeVar("T")
 logger = logging.getLogger(__name__)
 
-BUILTIN_PATTERNS = {
-    "vname": r"[A-Za-z]\w+",
-    "number": r"-?(([1-9]+\d*)|0)(\.\d*)?",
-    "string": r"((?:\\)\"[^\"]*(?:\\)\")|((?:\\)'[^\']*(?:\\)')",
-}
-
 
 # class FlangUtilities:
 #     def component(self, children=[], is_root=False, **attrs):
@@ -32,23 +28,23 @@ BUILTIN_PATTERNS = {
 
 
 class FlangCodeGenerator:
-    def __init__(self, root_component: FlangComponent) -> None:
+    def __init__(self, root_component: FlangComponent, samples: SampleStore | None = None) -> None:
+        """
+        Samples can be kept in a persistent store (SQLiteSampleStore) shared between processes
+        """
         self.root: FlangComponent = root_component
-        self.samples: list[defaultdict] = []
+        self.samples: SampleStore = samples if samples is not None else FlangSampleStore()
 
     def feed(self, text):
         sample, _ = self.root.match(text)
-        self.samples.append(defaultdict(None, sample))
-
-    def fix_incomplete_spec(self, incomplete_spec: dict):
-        similarities = []
-        for sample in self.samples:
-            sim = sum(1 for key, value in sample.items() if incomplete_spec.get(key) == value)
-            similarities.append(sim)
-
-        idx_of_most_similar = similarities.index(max(similarities))
-        incomplete_spec.update(self.samples[idx_of_most_similar])
-        return incomplete_spec  # todo: should be pure!
+        self.samples.add(sample)
+
+    def fix_incomplete_spec(self, incomplete_spec: dict) -> dict:
+        """
+        Fills keys missing in the spec with values of the most similar fed sample
+        """
+        [(idx_of_most_similar, _)] = self.samples.most_similar(incomplete_spec, k=1)
+        return {**self.samples[idx_of_most_similar], **incomplete_spec}
 
     def generate(self, incomplete_spec: dict):
         spec = self.fix_incomplete_spec(incomplete_spec)
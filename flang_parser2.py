@@ -1,55 +1,112 @@
 from __future__ import annotations
 import os
-import xml.etree.ElementTree as ET
-import warnings
+from xml.parsers import expat
 import functools
+import collections
+import threading
+import warnings
+from typing import Callable, Iterable, Iterator
 
 from utils.dataclasses import (
     BaseFlangConstruct,
     FlangObject,
     IntermediateFlangTreeElement,
     FlangMatchObject,
-    Postition,
+    FusedSegment,
+    FlangBatchResult,
+    SourcePosition,
 )
 from utils.abstracts import (
     TextToIntermediateTreeParser,
     SingleFileParser,
     FlangProcessor,
 )
-from utils.helpers import interlace
+from utils.optimizations import fuse_components, index_choices
+from utils.cache import FlangObjectCache
+from utils.library import FlangLibrary, is_library_file
+from utils.batch import run_in_pool
+from utils.anchors import AhoCorasick, mandatory_literals
+from utils.generation import compile_generation_plan
+from utils.tape import FlangMatchTape
+from utils.compiler import Matcher, compile_matcher
+from utils.profiling import MatchProfiler
+from utils.patterns import PATTERNS, UnknownPatternError
+from utils.helpers import ATTRIBUTES
+from utils.linker import link_references
+from utils.surface import FlangSurfaceParser, FlangSyntaxError
+from utils.loader import FlangDependencyCycleError, dependency_files, find_cycle, parse_template, parse_templates
 import utils.constructs as c
 
 
 class FlangXMLParser(TextToIntermediateTreeParser):
-    def _build_tree(
-        self,
-        element: ET.Element | str,
-        index: int = 0,
-        last_element: bool = True,
-    ):
-        if isinstance(element, str):
-            if index == 0:
-                element = element.removeprefix("\n")
-            if last_element:
-                element = element.removesuffix("\n")
+    """
+    Builds the intermediate tree straight from expat events in a single pass,
+    without recursion, so the time depends only on the size of the template
+    and not on how deeply it is nested.
+    Only direct text of the element and tails of its children belong to it,
+    newline right after the opening tag and right before the closing tag is dropped
+    """
+
+    def parse(self, text: str) -> IntermediateFlangTreeElement:
+        parser = expat.ParserCreate()
+        # (name, attributes, position, children) of every open element
+        stack: list[tuple[str, dict, SourcePosition, list]] = []
+        text_chunks: list[str] = []
+        text_position: SourcePosition | None = None
+        root: IntermediateFlangTreeElement | None = None
+
+        def flush_text():
+            if text_chunks:
+                stack[-1][3].append(IntermediateFlangTreeElement("text", "".join(text_chunks), position=text_position))
+                text_chunks.clear()
+
+        def start_element(name: str, attributes: dict[str, str]):
+            if stack:
+                flush_text()
+
+            stack.append((name, attributes, SourcePosition(parser.CurrentLineNumber, parser.CurrentColumnNumber), []))
+
+        def end_element(_: str):
+            nonlocal root
+            flush_text()
+            name, attributes, position, children = stack.pop()
+
+            if children and isinstance(children[0].value, str):
+                children[0].value = children[0].value.removeprefix("\n")
+            if children and isinstance(children[-1].value, str):
+                children[-1].value = children[-1].value.removesuffix("\n")
+
+            element = IntermediateFlangTreeElement(
+                name=name,
+                value=[child for child in children if child.value != ""],
+                attributes=attributes,
+                position=position,
+            )
 
-            return IntermediateFlangTreeElement("text", element) if element else None
+            if stack:
+                stack[-1][3].append(element)
+            else:
+                root = element
 
-        children_list = [item for item in interlace(element.itertext(), element)]
+        def character_data(data: str):
+            nonlocal text_position
 
-        children: list[IntermediateFlangTreeElement] = (
-            self._build_tree(child, index=idx, last_element=idx == len(children_list) - 1)
-            for idx, child in enumerate(children_list)
-        )
-        children = list(filter(None, children))
+            if not stack:
+                return
+            if not text_chunks:
+                text_position = SourcePosition(parser.CurrentLineNumber, parser.CurrentColumnNumber)
+            text_chunks.append(data)
 
-        return IntermediateFlangTreeElement(
-            name=element.tag, value=children, attributes=element.attrib
-        )
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
 
-    def parse(self, text: str) -> IntermediateFlangTreeElement:
-        processed_xml = ET.fromstring(text)
-        return self._build_tree(processed_xml)
+        try:
+            parser.Parse(text, True)
+        except expat.ExpatError as error:
+            raise FlangSyntaxError(expat.errors.messages[error.code], SourcePosition(error.lineno, error.offset)) from error
+
+        return root
 
 
 class FlangStandardParser(SingleFileParser):
@@ -76,11 +133,16 @@ class FlangStandardParser(SingleFileParser):
     ):
         construct_class = self.CONSTRUCTS[intermediate_tree.name]
 
-        construct_obj = construct_class(
-            children_or_value=intermediate_tree.value if isinstance(intermediate_tree.value, str) else None,
-            attributes=intermediate_tree.attributes,
-            parent=location,
-        )
+        try:
+            construct_obj = construct_class(
+                children_or_value=intermediate_tree.value if isinstance(intermediate_tree.value, str) else None,
+                attributes=ATTRIBUTES.intern(intermediate_tree.attributes),
+                parent=location,
+            )
+        except UnknownPatternError as error:
+            if intermediate_tree.position is None:
+                raise
+            raise FlangSyntaxError(str(error), intermediate_tree.position) from error
         assert isinstance(construct_obj, BaseFlangConstruct)
 
         symbol_full_name = construct_obj.get_full_location()
@@ -94,7 +156,11 @@ class FlangStandardParser(SingleFileParser):
         if not location:
             flang_object.root = symbol_full_name
 
+        if symbol_full_name in flang_object.symbols:
+            flang_object.duplicate_symbols.add(symbol_full_name)
+
         flang_object.symbols[symbol_full_name] = construct_obj
+        flang_object.external_dependencies.extend(construct_obj.external_dependencies)
         # if isinstance(construct_obj, AccessibleConstruct):
         #     self.symbols[construct_obj.path] = construct_obj
 
@@ -121,10 +187,38 @@ class FlangTextProcessor(FlangProcessor):
     Forward pass through processor generates source code from provided schema based on the flang object
     Backward pass through processor generates schema with parameters based on source code
     """
-    def __init__(self, flang_object: FlangObject, stop_on_error: bool = False) -> any:
+    MEMOIZED_CONSTRUCTS = (c.FlangComponent, c.FlangChoice)
+
+    def __init__(
+        self,
+        flang_object: FlangObject,
+        stop_on_error: bool = False,
+        memoize: bool = False,
+        tape: bool = False,
+        compiled: bool = True,
+        profile: bool = False,
+    ) -> any:
+        """
+        With tape=True matches are returned as FlangMatchTape, which is cheap to send
+        between processes.
+        With compiled=True the flang object is compiled into closures on first run,
+        otherwise every construct is dispatched while matching.
+        With profile=True statistics of every construct are collected in the profiler
+        of the processor, only the compiled matcher can be profiled
+        """
+        assert compiled or not profile, "Only the compiled matcher can be profiled"
+
         self.root = flang_object.root_component
         self.object = flang_object
         self.stop_on_error = stop_on_error
+        self.memoize = memoize
+        self.tape = tape
+        self.compiled = compiled
+        self._compiled_matcher = None
+        self.profiler = MatchProfiler() if profile else None
+        self.memo: dict[tuple[int, int], FlangMatchObject | None] | None = None
+        self.memo_hits = 0
+        self.memo_misses = 0
 
     def return_without_match(self, reason=""):
         if self.stop_on_error:
@@ -139,110 +233,769 @@ class FlangTextProcessor(FlangProcessor):
         self, construct: c.FlangComponent, text: str, start_position: int = 0
     ) -> FlangMatchObject | None:
         """
-        Component can only match based on its children
+        Component can only match based on its children, all of them have to match
         """
+        if construct.prod_rule:
+            return self._match_repetition(construct, text, start_position)
+
+        return self._match_body(construct, text, start_position)
+
+    def _match_body(
+        self, construct: c.FlangComponent, text: str, start_position: int
+    ) -> FlangMatchObject | None:
+        if construct.is_choice:
+            return self._match_alternatives(construct, text, start_position)
+
         spec = {}
+        end_position = self._match_children(
+            construct.match_plan or construct.children, text, start_position, spec
+        )
+
+        if end_position is None:
+            return None
+
+        return FlangMatchObject(start_position, end_position, text, spec)
+
+    def _match_repetition(
+        self, construct: c.FlangComponent, text: str, start_position: int
+    ) -> FlangMatchObject | None:
+        """
+        Walks the body of a "?", "*" or "+" component again at every position.
+        Stops on the first failed or empty iteration, only "+" fails when there is none
+        """
+        if construct.prod_rule == "?":
+            if (match_object := self._match_body(construct, text, start_position)) is not None:
+                return match_object
+            return FlangMatchObject(start_position, start_position, text, {})
+
+        spec, end_position, matched = {}, start_position, False
+
+        while (match_object := self._match_body(construct, text, end_position)) is not None:
+            matched = True
+
+            if match_object.end == end_position:
+                break  # empty iteration would repeat forever
+
+            spec[str(len(spec))] = match_object
+            end_position = match_object.end
+
+        if construct.prod_rule == "+" and not matched:
+            return None
+
+        return FlangMatchObject(start_position, end_position, text, spec)
+
+    @_match.register
+    def __dispatched_match(
+        self, construct: c.FlangChoice, text: str, start_position: int = 0
+    ) -> FlangMatchObject | None:
+        return self._match_alternatives(construct, text, start_position)
+
+    def _match_alternatives(
+        self, construct: c.FlangChoice | c.FlangComponent, text: str, start_position: int
+    ) -> FlangMatchObject | None:
+        """
+        Ordered choice, first alternative that matches wins.
+        The index lets us skip alternatives that cannot start with the current character
+        """
+        alternatives = (
+            construct.choice_index.candidates(text, start_position)
+            if construct.choice_index
+            else c.alternatives_of(construct)
+        )
+
+        for alternative in alternatives:
+            if (match_object := self.match(alternative, text, start_position)) is None:
+                continue
+
+            if not (key := c.spec_key(alternative)):
+                return match_object
+
+            return FlangMatchObject(match_object.start, match_object.end, text, {key: match_object})
+
+        return None
+
+    def _match_children(
+        self,
+        children: list[c.BaseFlangConstruct | FusedSegment],
+        text: str,
+        start_position: int,
+        spec: dict[str, FlangMatchObject],
+    ) -> int | None:
         end_position = start_position
 
-        for child in construct.children:
-            match_object = self.match(child, text, end_position)
+        for child in children:
+            if isinstance(child, FusedSegment):
+                if not (fused_match := child.pattern.match(text, end_position)):
+                    return None
+
+                spec.update(child.to_spec(fused_match))
+                end_position = fused_match.end()
+                continue
+
+            if not self.can_construct_match(child):
+                continue
 
-            if match_object is not None:
-                if child.symbol:
-                    spec[child.symbol] = match_object
+            if (match_object := self.match(child, text, end_position)) is None:
+                return None
 
-                end_position = match_object.position.end
+            if key := c.spec_key(child):
+                spec[key] = match_object
+            elif match_object.spec:
+                # captures of an unnamed component belong to the enclosing one
+                spec.update(match_object.spec)
 
-        return FlangMatchObject(position=Postition(start_position, end_position), spec_or_matched=spec)
+            end_position = match_object.end
+
+        return end_position
 
     @_match.register
     def __dispatched_match(
         self, construct: c.FlangRawText, text: str, start_position: int = 0
     ) -> FlangMatchObject | None:
         if text.startswith(construct.value, start_position):
-            return FlangMatchObject(
-                position=Postition(start_position, len(construct.value) + start_position),
-                spec_or_matched=construct.value,
-            )
+            return FlangMatchObject(start_position, start_position + len(construct.value), text)
 
     @_match.register
     def __dispatched_match(
         self, construct: c.FlangPredicate, text: str, start_position: int = 0
     ) -> FlangMatchObject | None:
         if match := construct.pattern.match(text, start_position):
-            return FlangMatchObject(
-                position=Postition(start_position, match.end()),
-                spec_or_matched=match.group(),
-            )
+            return FlangMatchObject(start_position, match.end(), text)
 
     @_match.register
     def __dispatched_match(
         self, construct: c.FlangReference, *args, **kwargs
     ) -> FlangMatchObject | None:
-        referenced_object = self.object.find_refrenced_object(symbol := construct.attributes["ref"])
-        assert referenced_object, f"Cannot find object {symbol}"
+        assert construct.target, f"Reference {construct.reference} is not linked"
 
-        return self._match(referenced_object, *args, **kwargs)
+        return self._memoized_match(construct.target, *args, **kwargs)
 
-    def match(self, construct: c.FlangReference, *args, **kwargs):
+    def _memoized_match(
+        self, construct: c.BaseFlangConstruct, text: str, start_position: int = 0
+    ) -> FlangMatchObject | None:
+        """
+        Packrat cache of (construct, position) pairs for the duration of a single run.
+        Entry is seeded with a failure before matching, so left recursive
+        references fail instead of recursing forever
+        """
+        if self.memo is None or not isinstance(construct, self.MEMOIZED_CONSTRUCTS):
+            return self._match(construct, text, start_position)
+
+        key = (id(construct), start_position)
+
+        if key in self.memo:
+            self.memo_hits += 1
+            return self.memo[key]
+
+        self.memo_misses += 1
+        self.memo[key] = None
+        self.memo[key] = result = self._match(construct, text, start_position)
+        return result
+
+    def match(self, construct: c.BaseFlangConstruct, *args, **kwargs):
         if not self.can_construct_match(construct):
             return None
 
-        result = self._match(construct, *args, **kwargs)
-        return self.return_without_match() if result is None else result
+        return self._memoized_match(construct, *args, **kwargs)
+
+    @property
+    def compiled_matcher(self) -> Matcher:
+        if self._compiled_matcher is None:
+            self._compiled_matcher = compile_matcher(
+                self.object, self if self.memoize else None, self.profiler
+            )
+
+        return self._compiled_matcher
+
+    def __getstate__(self):
+        # closures cannot be pickled, workers compile the matcher again
+        return {**self.__dict__, "_compiled_matcher": None}
+
+    def run(self, sample: str) -> FlangMatchObject | FlangMatchTape | None:
+        if self.compiled and not self.memoize:
+            result = (self._compiled_matcher or self.compiled_matcher)(sample, 0)
+        else:
+            self.memo = {} if self.memoize else None
 
-    def run(self, sample: str) -> FlangMatchObject | None:
-        return self.match(self.root, sample)
+            try:
+                result = self.compiled_matcher(sample, 0) if self.compiled else self.match(self.root, sample)
+            finally:
+                self.memo = None
+
+        if result is None:
+            return self.return_without_match("sample does not match the root")
+
+        return FlangMatchTape.from_match_object(result) if self.tape else result
+
+    def run_many(
+        self,
+        samples: Iterable[str],
+        workers: int | None = None,
+        chunksize: int = 256,
+        ordered: bool = True,
+    ) -> Iterator[FlangBatchResult]:
+        """
+        Matches samples in a pool of processes. Failure of a single sample is reported
+        in its result and does not stop the batch
+        """
+        return run_in_pool(self, samples, workers=workers, chunksize=chunksize, ordered=ordered)
+
+    @property
+    def input_type(self) -> type:
+        return str
+
+    @property
+    def output_type(self) -> type:
+        return FlangMatchTape if self.tape else FlangMatchObject
 
     @staticmethod
     def can_construct_match(construct: c.BaseFlangConstruct):
-        if isinstance(construct, c.FlangComponent):
-            return construct.attributes.get("name") != "definition"
-        if isinstance(construct, (c.FlangRawText, c.FlangPredicate)):
-            return True
-        return False
+        return c.is_matchable(construct)
+
+
+class FlangGenerationProcessor(FlangProcessor):
+    """
+    Forward pass, generates source code from the spec.
+    The template is compiled once into a generation plan, so generating only fills
+    the format template with values of the spec
+    """
+
+    def __init__(self, flang_object: FlangObject) -> None:
+        self.object = flang_object
+        self.plan = compile_generation_plan(flang_object)
+
+    def run(self, spec: dict[str, str]) -> str:
+        return self.plan.generate(spec)
+
+    def generate_many(self, specs: Iterable[dict[str, str]]) -> Iterator[str]:
+        generate = self.plan.generate
+        return (generate(spec) for spec in specs)
+
+    def run_many(
+        self,
+        specs: Iterable[dict[str, str]],
+        workers: int | None = None,
+        chunksize: int = 256,
+        ordered: bool = True,
+    ) -> Iterator[FlangBatchResult]:
+        return run_in_pool(self, specs, workers=workers, chunksize=chunksize, ordered=ordered)
+
+    @property
+    def input_type(self) -> type:
+        return dict
+
+    @property
+    def output_type(self) -> type:
+        return str
+
+
+class TemplateSet:
+    """
+    Picks the flang objects matching a sample out of many templates.
+
+    Mandatory text of every template is indexed in a single Aho-Corasick automaton,
+    so a sample is scanned once. Only templates with all of their anchors present
+    in the sample are fully matched, the most specific ones first
+    """
+
+    def __init__(
+        self,
+        flang_objects: dict[str, FlangObject] | Iterable[FlangObject] = (),
+        processor_class: type[FlangTextProcessor] = FlangTextProcessor,
+    ) -> None:
+        self.processor_class = processor_class
+        self.processors: dict[str, FlangTextProcessor] = {}
+        self.anchors: dict[str, set[str]] = {}
+        self.templates_by_anchor: dict[str, list[str]] = collections.defaultdict(list)
+        self.automaton = AhoCorasick()
+        self.unanchored: list[str] = []
+
+        if not isinstance(flang_objects, dict):
+            flang_objects = {flang_object.root: flang_object for flang_object in flang_objects}
+
+        for name, flang_object in flang_objects.items():
+            self.add(name, flang_object)
+
+    def add(self, name: str, flang_object: FlangObject) -> None:
+        assert name not in self.processors, f"Template {name} is already in the set"
+        self.processors[name] = self.processor_class(flang_object)
+        self.anchors[name] = mandatory_literals(flang_object)
+
+        if not self.anchors[name]:
+            self.unanchored.append(name)
+
+        for anchor in self.anchors[name]:
+            self.templates_by_anchor[anchor].append(name)
+            self.automaton.add(anchor)
+
+    def candidates(self, sample: str) -> list[str]:
+        anchor_hits = collections.Counter()
+
+        for anchor in self.automaton.find_all(sample):
+            anchor_hits.update(self.templates_by_anchor[anchor])
+
+        candidates = [name for name, hits in anchor_hits.items() if hits == len(self.anchors[name])]
+        candidates.sort(key=lambda name: anchor_hits[name], reverse=True)
+
+        # templates without anchors cannot be ruled out
+        return candidates + self.unanchored
+
+    def classify(self, sample: str, first_only: bool = True) -> list[tuple[str, FlangMatchObject]]:
+        matches = []
+
+        for name in self.candidates(sample):
+            if (match_object := self.processors[name].run(sample)) is None:
+                continue
+
+            matches.append((name, match_object))
+
+            if first_only:
+                break
+
+        return matches
 
 
 class FlangParser:
-    def __init__(self) -> None:
+    VERSION = "2.4.0"  # bump on every change affecting the built flang objects
+
+    def __init__(
+        self,
+        cache_directory: str | None = None,
+        use_cache: bool = False,
+        lazy_libraries: bool = False,
+        load_workers: int | None = None,
+        load_in_processes: bool = False,
+    ) -> None:
         self.intermediate_parser: TextToIntermediateTreeParser = FlangXMLParser()
+        self.surface_parser: TextToIntermediateTreeParser = FlangSurfaceParser()
         self.single_file_parser_class: SingleFileParser = FlangStandardParser
         self.single_file_parsers: dict = {}
         self.symbol_table = {}
+        # global locations of symbols defined more than once in their file
+        self.duplicate_symbols: set[str] = set()
+        self.lazy_libraries = lazy_libraries
+        self.load_workers = load_workers
+        self.load_in_processes = load_in_processes
+        self.flang_objects: dict[str, FlangObject] = {}
+        # files each loaded file imports symbols from
+        self.dependency_graph: dict[str, list[str]] = {}
+        self.optimized_files: set[str] = set()
+        self.file_mtimes: dict[str, int] = {}
+        self.libraries: dict[str, FlangLibrary] = {}
+        self.cache: FlangObjectCache | None = (
+            FlangObjectCache(cache_directory, version=self.VERSION)
+            if use_cache or cache_directory
+            else None
+        )
 
     def parse_text(self, text: str, path: str | None = None, evaluate: bool = True):
         path = path or os.getcwd()
-        intermediate_tree = self.intermediate_parser.parse(text)
-        assert intermediate_tree.name == "component"  # sanity check
+        optimized = evaluate
+        cache_key = self.cache.key(text, str(evaluate), PATTERNS.fingerprint) if self.cache else None
+        flang_object = self.cache.load(cache_key) if self.cache else None
+        subparser = self.single_file_parser_class()
+        self.single_file_parsers[path] = subparser
 
-        # self._evaluate_intermediate_tree(intermediate_tree)
+        if flang_object is None:
+            # self._evaluate_intermediate_tree(intermediate_tree)
 
-        subparser = FlangStandardParser()
-        self.single_file_parsers[path] = subparser
-        flang_object = subparser.parse(intermediate_tree)
+            flang_object = parse_template(text, self.intermediate_parser_for(path), subparser)
+        else:
+            # cached objects are stored already optimized
+            evaluate = False
+            cache_key = None
+
+        self.register(flang_object, path)
+
+        try:
+            self.load_dependencies(flang_object, path)
+            self.link(flang_object)
+        except Exception:
+            # nothing of the broken file is kept, so its fixed version can be parsed again
+            self.unregister(path)
+            raise
+
+        if evaluate:
+            # This is the file we return to user.
+            # We should perform optimizations and stuff
+            self.perform_optimizations(flang_object)
+
+        if optimized:
+            self.optimized_files.add(path)
+
+            # dependencies are loaded without evaluation, they are optimized once all of them are linked
+            for dependency in self.dependencies(path):
+                if dependency not in self.optimized_files:
+                    self.perform_optimizations(self.flang_objects[dependency])
+                    self.optimized_files.add(dependency)
+
+        if cache_key:
+            self.cache.store(cache_key, flang_object, self.dependencies(path))
+
+        return flang_object
+
+    def intermediate_parser_for(self, path: str) -> TextToIntermediateTreeParser:
+        """
+        Files with .flang extension are written in the surface syntax, all other in XML
+        """
+        return self.surface_parser if path.endswith(".flang") else self.intermediate_parser
+
+    def register(self, flang_object: FlangObject, path: str):
+        self._add_symbols(flang_object, path)
+        self.flang_objects[path] = flang_object
+        self.dependency_graph[path] = dependency_files(flang_object)
+
+        if os.path.isfile(path):
+            self.file_mtimes[path] = os.stat(path).st_mtime_ns
+
+    def unregister(self, path: str):
+        flang_object = self.flang_objects.pop(path)
+        del self.dependency_graph[path]
+        self._remove_symbols(flang_object, path)
+
+    def _add_symbols(self, flang_object: FlangObject, path: str):
         global_symbols = self.translate_local_symbol_table_to_global(flang_object.symbols, path)
 
         assert (
             not self.symbol_table.keys() & global_symbols.keys()
         ), "Symbols are repeating! Possible recursive import"
         self.symbol_table.update(global_symbols)
+        self.duplicate_symbols.update(f"{path}:{symbol}" for symbol in flang_object.duplicate_symbols)
 
-        for dependency in flang_object.external_dependencies:
-            if dependency not in self.symbol_table:
-                source, _ = dependency.split(":")
-                self.parse_file(source, evaluate=False)
+    def _remove_symbols(self, flang_object: FlangObject, path: str):
+        for symbol in flang_object.symbols:
+            del self.symbol_table[f"{path}:{symbol}"]
 
-        if evaluate:
-            # This is the file we return to user.
-            # We should perform optimizations and stuff
-            self.perform_optimizations(flang_object)
+        self.duplicate_symbols.difference_update(
+            f"{path}:{symbol}" for symbol in flang_object.duplicate_symbols
+        )
+
+    def dependents(self, path: str) -> list[str]:
+        """
+        Files importing symbols of the file, directly or through other files
+        """
+        importers = collections.defaultdict(list)
+
+        for importer, dependencies in self.dependency_graph.items():
+            for dependency in dependencies:
+                if dependency != importer:
+                    importers[dependency].append(importer)
+
+        queue = collections.deque(importers[path])
+        found = {}
+
+        while queue:
+            if (dependent := queue.popleft()) in found or dependent == path:
+                continue
+
+            found[dependent] = None
+            queue.extend(importers[dependent])
+
+        return list(found)
+
+    def dependencies(self, path: str) -> list[str]:
+        """
+        Files the file imports symbols from, directly or through other files
+        """
+        queue = collections.deque(self.dependency_graph.get(path, ()))
+        found = {}
+
+        while queue:
+            if (dependency := queue.popleft()) in found or dependency == path:
+                continue
+
+            found[dependency] = None
+            queue.extend(self.dependency_graph.get(dependency, ()))
+
+        return list(found)
+
+    def reload(self, path: str) -> FlangObject:
+        """
+        Parses the changed file again and relinks only the files depending on it.
+        When the new version cannot be loaded, the old one is restored.
+        Processors built before the reload keep using the old constructs
+        """
+        if path in self.libraries:
+            return self._reload_library(path)
+
+        with open(path) as f:
+            subparser = self.single_file_parser_class()
+            flang_object = parse_template(f.read(), self.intermediate_parser_for(path), subparser)
+
+        old_object = self.flang_objects[path]
+        affected = [path, *self.dependents(path)]
+        self.unregister(path)
+
+        try:
+            self.register(flang_object, path)
+            self.load_dependencies(flang_object, path)
+
+            for affected_path in affected:
+                self.link(self.flang_objects[affected_path])
+        except Exception:
+            self.unregister(path)
+            self.register(old_object, path)
+
+            for affected_path in affected:
+                self.link(self.flang_objects[affected_path])
+            raise
+
+        self.single_file_parsers[path] = subparser
+
+        for affected_path in affected:
+            if affected_path in self.optimized_files:
+                self.perform_optimizations(self.flang_objects[affected_path])
 
         return flang_object
 
+    def _reload_library(self, path: str) -> FlangObject:
+        """
+        Builds again only the components of the library that were loaded before
+        """
+        old_library = self.libraries.pop(path)
+        affected = [path, *self.dependents(path)]
+        self.unregister(path)
+
+        try:
+            for name in old_library.components:
+                self.load_library_component(path, name, evaluate=False)
+
+            for affected_path in affected:
+                self.link(self.flang_objects[affected_path])
+        except Exception:
+            if path in self.flang_objects:
+                self.unregister(path)
+
+            self.libraries[path] = old_library
+            self.register(old_library.loaded, path)
+
+            for affected_path in affected:
+                self.link(self.flang_objects[affected_path])
+            raise
+
+        for affected_path in affected:
+            if affected_path in self.optimized_files:
+                self.perform_optimizations(self.flang_objects[affected_path])
+
+        return self.flang_objects[path]
+
+    def poll_changes(self, on_reload: Callable[[str, Exception | None], any] | None = None) -> list[str]:
+        """
+        Reloads files modified since they were loaded and returns their paths.
+        Broken version of a file is not retried, the error is passed to on_reload
+        or raised when there is no callback
+        """
+        changed = [
+            path
+            for path, mtime in self.file_mtimes.items()
+            if os.path.isfile(path) and os.stat(path).st_mtime_ns != mtime
+        ]
+
+        for path in changed:
+            try:
+                self.reload(path)
+            except Exception as error:
+                self.file_mtimes[path] = os.stat(path).st_mtime_ns
+
+                if on_reload is None:
+                    raise
+                on_reload(path, error)
+            else:
+                on_reload and on_reload(path, None)
+
+        return changed
+
+    def watch(
+        self,
+        interval: float = 1.0,
+        stop_event: threading.Event | None = None,
+        on_reload: Callable[[str, Exception | None], any] | None = None,
+    ):
+        """
+        Blocks and polls loaded files for changes until the stop event is set
+        """
+
+        def warn_on_error(path: str, error: Exception | None):
+            if error is not None:
+                warnings.warn(f"Cannot reload {path}: {error}")
+
+        stop_event = stop_event or threading.Event()
+
+        while not stop_event.wait(interval):
+            self.poll_changes(on_reload or warn_on_error)
+
     def parse_file(self, filepath: str, evaluate: bool = True):
         with open(filepath) as f:
             return self.parse_text(f.read(), filepath, evaluate)
 
+    def parse_library(self, filepath: str) -> FlangLibrary:
+        if filepath not in self.libraries:
+            self.libraries[filepath] = FlangLibrary(
+                filepath, self.intermediate_parser, self.single_file_parser_class(), self.cache
+            )
+
+        return self.libraries[filepath]
+
+    def is_library(self, path: str) -> bool:
+        """
+        With lazy_libraries, files wrapping many components are loaded component by
+        component, all other files are loaded whole
+        """
+        if not self.lazy_libraries or path.endswith(".flang"):
+            return False
+
+        return path in self.libraries or (path not in self.flang_objects and is_library_file(path))
+
+    def load_library_component(self, filepath: str, name: str, evaluate: bool = True) -> FlangObject:
+        """
+        The component is registered as a part of the library file, so the library
+        takes part in cycle detection, reloading and dependents of the files like any other file
+        """
+        library = self.parse_library(filepath)
+        already_loaded = name in library.components
+        flang_object = library.get(name)
+
+        if not already_loaded:
+            files = dependency_files(library.loaded)
+
+            if set(files) - set(self.dependency_graph.get(filepath, ())):
+                if cycle := find_cycle(self.dependency_graph | {filepath: files}):
+                    library.discard(name)
+                    raise FlangDependencyCycleError(cycle)
+
+            self.register_library_component(flang_object, filepath)
+
+            try:
+                self.load_dependencies(flang_object, filepath)
+                self.link(flang_object)
+            except Exception:
+                self.unregister_library_component(filepath, name)
+                raise
+
+        if evaluate or (not already_loaded and filepath in self.optimized_files):
+            self.perform_optimizations(flang_object)
+
+        return flang_object
+
+    def register_library_component(self, flang_object: FlangObject, path: str):
+        self._add_symbols(flang_object, path)
+        self.flang_objects[path] = self.libraries[path].loaded
+        self.dependency_graph[path] = dependency_files(self.libraries[path].loaded)
+
+        if os.path.isfile(path):
+            self.file_mtimes[path] = os.stat(path).st_mtime_ns
+
+    def unregister_library_component(self, path: str, name: str):
+        library = self.libraries[path]
+        self._remove_symbols(library.discard(name), path)
+        self.dependency_graph[path] = dependency_files(library.loaded)
+
+    def load_dependencies(self, flang_object: FlangObject, path: str | None = None):
+        self.load_files(
+            [dependency for dependency in dependency_files(flang_object) if not self.is_library(dependency)],
+            importer=path,
+        )
+        self.load_library_dependencies(flang_object)
+
+    def load_library_dependencies(self, flang_object: FlangObject):
+        for dependency in flang_object.external_dependencies:
+            source, symbol = dependency.split(":")
+            # only top level component containing the symbol is built, missing ones are reported by the linker
+            name = symbol.split(".")[0]
+
+            if dependency not in self.symbol_table and self.is_library(source) and name in self.parse_library(source):
+                self.load_library_component(source, name, evaluate=False)
+
+    def load_files(self, paths: list[str], importer: str | None = None) -> dict[str, FlangObject]:
+        """
+        Loads the whole import graph of the files before registering any of them.
+        The graph is walked level by level, with load_in_processes files of every
+        level are parsed in a process pool. Files shared by many templates are parsed only once
+        """
+        graph = self.dependency_graph | ({importer: paths} if importer else {})
+        loaded: dict[str, FlangObject] = {}
+        pending = [path for path in dict.fromkeys(paths) if path not in self.flang_objects]
+
+        while pending:
+            parsed = self._parse_files(pending)
+            loaded.update(parsed)
+            graph.update((path, dependency_files(flang_object)) for path, flang_object in parsed.items())
+            pending = list(
+                dict.fromkeys(
+                    dependency
+                    for path in parsed
+                    for dependency in graph[path]
+                    if dependency not in self.flang_objects
+                    and dependency not in loaded
+                    and not self.is_library(dependency)
+                )
+            )
+
+        if cycle := find_cycle(graph):
+            raise FlangDependencyCycleError(cycle)
+
+        registered = []
+
+        try:
+            for path, flang_object in loaded.items():
+                self.register(flang_object, path)
+                registered.append(path)
+
+            for flang_object in loaded.values():
+                self.load_library_dependencies(flang_object)
+
+            for flang_object in loaded.values():
+                self.link(flang_object)
+        except Exception:
+            for path in registered:
+                self.unregister(path)
+            raise
+
+        return loaded
+
+    def _parse_files(self, paths: list[str]) -> dict[str, FlangObject]:
+        parsed: dict[str, FlangObject] = {}
+        texts: dict[str, str] = {}
+        cache_keys: dict[str, str] = {}
+
+        for path in paths:
+            with open(path) as f:
+                text = f.read()
+
+            self.single_file_parsers[path] = self.single_file_parser_class()
+
+            if self.cache:
+                cache_keys[path] = self.cache.key(text, str(False), PATTERNS.fingerprint)
+
+                if (flang_object := self.cache.load(cache_keys[path])) is not None:
+                    parsed[path] = flang_object
+                    continue
+
+            texts[path] = text
+
+        built = parse_templates(
+            texts,
+            {path: self.intermediate_parser_for(path) for path in texts},
+            self.single_file_parsers,
+            workers=self.load_workers,
+            processes=self.load_in_processes,
+        )
+
+        if self.cache:
+            for path, flang_object in built.items():
+                self.cache.store(cache_keys[path], flang_object)
+
+        return parsed | built
+
+    def link(self, flang_object: FlangObject):
+        """
+        Broken templates fail here, when they are loaded, and not while matching
+        """
+        for dependency in flang_object.external_dependencies:
+            flang_object.external_symbols[dependency] = self.symbol_table.get(dependency)
+
+        link_references(flang_object, ambiguous=self.duplicate_symbols)
+
     def translate_local_symbol_table_to_global(self, symbol_table: dict, path: str) -> dict:
         return {f"{path}:{symbol}": value for symbol, value in symbol_table.items()}
 
@@ -250,4 +1003,5 @@ class FlangParser:
         ...
 
     def perform_optimizations(self, root: FlangObject):
-        warnings.warn("Optimizations not implemented!")
+        fuse_components(root)
+        index_choices(root)
@@ -0,0 +1,23 @@
+from unittest import TestCase
+from flang_parser2 import FlangParser, FlangTextProcessor
+from test.test_optimizations import IMPORT_TEMPLATE
+
+SAMPLES = ["from json import dumps", "nothing to match", "from itertools import chain"]
+
+
+class RunManyTestCase(TestCase):
+    def setUp(self):
+        self.processor = FlangTextProcessor(FlangParser().parse_text(IMPORT_TEMPLATE), stop_on_error=True)
+
+    def test_results_are_ordered_and_failures_reported(self):
+        results = list(self.processor.run_many(SAMPLES * 10, workers=2, chunksize=4))
+
+        self.assertEqual([result.index for result in results], list(range(30)))
+        self.assertEqual([result.ok for result in results[:3]], [True, False, True])
+        self.assertEqual(results[2].result, self.processor.run(SAMPLES[2]))
+        self.assertTrue(results[1].error.startswith("RuntimeError"))
+
+    def test_unordered_results_cover_all_samples(self):
+        results = self.processor.run_many(SAMPLES * 10, workers=2, chunksize=4, ordered=False)
+
+        self.assertEqual(sorted(result.index for result in results), list(range(30)))
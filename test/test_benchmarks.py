@@ -0,0 +1,58 @@
+import os
+import tempfile
+from unittest import TestCase
+from flang_parser2 import FlangParser, FlangTextProcessor, FlangGenerationProcessor
+from benchmarks.generators import TemplateShape, generate_template, generate_surface_template, generate_corpus
+from benchmarks.suite import PHASES, PhaseResult, run_scenario, find_regressions, load_baseline, save_baseline
+from benchmarks.memory import measure_memory
+
+
+class GeneratorsTestCase(TestCase):
+    SHAPE = TemplateShape(statements=3, depth=2, fan_out=2, choice_width=3)
+
+    def test_corpus_matches_and_generates_back(self):
+        flang_object = FlangParser().parse_text(generate_template(self.SHAPE))
+        processor, generator = FlangTextProcessor(flang_object), FlangGenerationProcessor(flang_object)
+
+        for text, spec in generate_corpus(self.SHAPE, 10):
+            self.assertEqual(processor.run(text).end, len(text))
+            self.assertEqual(generator.run(spec), text)
+
+    def test_surface_template_matches_like_xml_template(self):
+        surface = FlangTextProcessor(FlangParser().parse_text(generate_surface_template(self.SHAPE), "shape.flang"))
+        xml = FlangTextProcessor(FlangParser().parse_text(generate_template(self.SHAPE)))
+
+        for text, _ in generate_corpus(self.SHAPE, 10):
+            self.assertEqual(surface.run(text), xml.run(text))
+
+
+class SuiteTestCase(TestCase):
+    def test_every_phase_is_measured(self):
+        results = run_scenario(TemplateShape(statements=2), corpus_size=3, repeat=1)
+
+        self.assertEqual(tuple(results), PHASES)
+        self.assertTrue(all(result.seconds > 0 for result in results.values()))
+
+    def test_slower_phase_is_a_regression(self):
+        results = {"small": {"match": PhaseResult(seconds=0.2, items=1, size=1, peak_memory=0)}}
+
+        self.assertEqual(find_regressions(results, {"small": {"match": {"seconds": 0.19}}}), [])
+        self.assertEqual(len(find_regressions(results, {"small": {"match": {"seconds": 0.1}}})), 1)
+
+    def test_baselines_are_kept_per_host(self):
+        results = {"small": {"match": PhaseResult(seconds=0.2, items=1, size=1, peak_memory=0)}}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            save_baseline(path, results, host="first")
+
+            self.assertEqual(load_baseline(path, host="first")["small"]["match"]["seconds"], 0.2)
+            self.assertEqual(load_baseline(path, host="second"), {})
+
+
+class MemoryTestCase(TestCase):
+    def test_every_stage_is_measured(self):
+        results = measure_memory(TemplateShape(statements=5), corpus_size=5)
+
+        self.assertEqual(tuple(results), ("template", "element", "construct", "match_node", "tape_node"))
+        self.assertTrue(all(result.objects > 0 and result.retained > 0 for result in results.values()))
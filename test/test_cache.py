@@ -0,0 +1,82 @@
+import os
+import tempfile
+from unittest import TestCase
+from flang_parser2 import FlangParser, FlangTextProcessor
+from utils.cache import FlangObjectCache
+from utils.patterns import PATTERNS
+
+DEPENDENCY_TEMPLATE = '<component name="lib">x<predicate name="v" pattern="{vname}"/></component>'
+MAIN_TEMPLATE = '<component name="main">a <predicate name="v" pattern="{number}"/><use ref="{}:lib"/></component>'
+
+
+class FlangObjectCacheTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_directory = os.path.join(self.directory.name, "cache")
+        self.dependency_path = os.path.join(self.directory.name, "dep.flang.xml")
+        self.main_path = os.path.join(self.directory.name, "main.flang.xml")
+
+        with open(self.dependency_path, "w") as f:
+            f.write(DEPENDENCY_TEMPLATE)
+
+        with open(self.main_path, "w") as f:
+            f.write(MAIN_TEMPLATE.replace("{}", self.dependency_path))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_second_parse_is_served_from_cache(self):
+        cold_parser = FlangParser(cache_directory=self.cache_directory)
+        cold = cold_parser.parse_file(self.main_path)
+        warm_parser = FlangParser(cache_directory=self.cache_directory)
+        warm = warm_parser.parse_file(self.main_path)
+
+        self.assertEqual((cold_parser.cache.hits, cold_parser.cache.misses), (0, 2))
+        self.assertEqual((warm_parser.cache.hits, warm_parser.cache.misses), (2, 0))
+        self.assertEqual(cold_parser.symbol_table.keys(), warm_parser.symbol_table.keys())
+        self.assertEqual(FlangTextProcessor(cold).run("a 12"), FlangTextProcessor(warm).run("a 12"))
+
+    def test_dependency_change_invalidates_entry(self):
+        FlangParser(cache_directory=self.cache_directory).parse_file(self.main_path)
+
+        with open(self.dependency_path, "w") as f:
+            f.write(DEPENDENCY_TEMPLATE.replace("x", "y"))
+
+        parser = FlangParser(cache_directory=self.cache_directory)
+        parser.parse_file(self.main_path)
+
+        self.assertEqual(parser.cache.hits, 0)
+
+    def test_indirect_dependency_change_invalidates_entry(self):
+        paths = {name: os.path.join(self.directory.name, f"{name}.flang.xml") for name in "abc"}
+        templates = {
+            "a": f'<component name="a"><choice><use ref="{paths["b"]}:x"/>z</choice></component>',
+            "b": f'<component name="x"><use ref="{paths["c"]}:y"/></component>',
+            "c": '<component name="y">foo</component>',
+        }
+
+        for name, template in templates.items():
+            with open(paths[name], "w") as f:
+                f.write(template)
+
+        FlangParser(cache_directory=self.cache_directory).parse_file(paths["a"])
+
+        with open(paths["c"], "w") as f:
+            f.write(templates["c"].replace("foo", "bar"))
+
+        flang_object = FlangParser(cache_directory=self.cache_directory).parse_file(paths["a"])
+
+        self.assertIsNotNone(FlangTextProcessor(flang_object).run("bar"))
+
+    def test_entry_leaves_out_dependencies(self):
+        parser = FlangParser(cache_directory=self.cache_directory)
+        parser.parse_file(self.main_path)
+        cache_key = parser.cache.key(
+            MAIN_TEMPLATE.replace("{}", self.dependency_path), str(True), PATTERNS.fingerprint
+        )
+        cached = FlangObjectCache(self.cache_directory, FlangParser.VERSION).load(cache_key)
+
+        self.assertEqual(list(cached.external_symbols.values()), [None])
+        warm = FlangParser(cache_directory=self.cache_directory).parse_file(self.main_path)
+
+        self.assertEqual(FlangTextProcessor(warm).run("a 12xab").end, 7)
@@ -0,0 +1,75 @@
+from unittest import TestCase
+from flang_parser2 import FlangParser, FlangGenerationProcessor, FlangTextProcessor
+from utils.generation import GenerationError
+from test.test_processors import CHOICE_TEMPLATE
+
+FUNCTION_TEMPLATE = "".join(
+    [
+        '<component name="file">',
+        'def <predicate name="name" pattern="{vname}"/>() {',
+        '<component name="body">return <predicate name="value" pattern="{number}"/></component>',
+        "}",
+        "</component>",
+    ]
+)
+
+
+class GenerationPlanTestCase(TestCase):
+    def test_plan_resolves_nested_key_paths(self):
+        processor = FlangGenerationProcessor(FlangParser().parse_text(FUNCTION_TEMPLATE))
+
+        self.assertEqual(processor.plan.fields, ("name", "body.value"))
+        self.assertEqual(processor.run({"name": "main", "body.value": "1"}), "def main() {return 1}")
+        self.assertRaises(GenerationError, processor.run, {"name": "main"})
+
+    def test_generate_many_streams_outputs(self):
+        processor = FlangGenerationProcessor(FlangParser().parse_text(FUNCTION_TEMPLATE))
+        outputs = processor.generate_many({"name": f"f{idx}", "body.value": str(idx)} for idx in range(3))
+
+        self.assertEqual(next(outputs), "def f0() {return 0}")
+        self.assertEqual(list(outputs), ["def f1() {return 1}", "def f2() {return 2}"])
+
+    def test_choice_picks_alternative_by_keys(self):
+        processor = FlangGenerationProcessor(FlangParser().parse_text(CHOICE_TEMPLATE))
+
+        self.assertEqual(processor.run({"statement.index.digits.v": "3"}), "3[]")
+        self.assertEqual(processor.run({"statement.word": "abc"}), "abc")
+        self.assertEqual(processor.run({}), "let")
+
+    def test_generates_from_matched_keys(self):
+        template = (
+            '<component name="import">'
+            '<component>from <predicate name="module" pattern="{vname}"/> </component>'
+            'import <predicate name="object" pattern="{vname}"/>'
+            "</component>"
+        )
+
+        for template, sample in ((template, "from json import dumps"), (CHOICE_TEMPLATE, "12()")):
+            flang_object = FlangParser().parse_text(template)
+            match_object = FlangTextProcessor(flang_object).run(sample)
+
+            self.assertEqual(FlangGenerationProcessor(flang_object).run(match_object.to_flat_dict()), sample)
+
+    def test_round_trip_through_nested_choices_and_optionals(self):
+        nested_choice = (
+            '<component name="root"><choice name="c">'
+            '<component name="a">b</component>'
+            '<choice name="n">'
+            '<component name="x"><predicate name="p" pattern="\\d+"/></component>'
+            '<component name="y"><predicate name="q" pattern="[a-z]+"/></component>'
+            "</choice>"
+            "</choice></component>"
+        )
+        optional_repetition = (
+            '<component name="root">[<component name="o" prod-rule="?">'
+            '<component name="items" prod-rule="+"><predicate name="v" pattern="\\d"/></component>'
+            "</component>]</component>"
+        )
+
+        for template, samples in ((nested_choice, ["42", "zz", "b"]), (optional_repetition, ["[12]", "[]"])):
+            flang_object = FlangParser().parse_text(template)
+            generator = FlangGenerationProcessor(flang_object)
+
+            for sample in samples:
+                spec = FlangTextProcessor(flang_object).run(sample).to_flat_dict()
+                self.assertEqual(generator.run(spec), sample)
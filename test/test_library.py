@@ -0,0 +1,93 @@
+import os
+import tempfile
+from unittest import TestCase
+from flang_parser2 import FlangParser, FlangTextProcessor
+from utils.loader import FlangDependencyCycleError
+
+LIBRARY_TEMPLATE = """<components>
+    <component name="first">let <predicate name="v" pattern="{vname}"/>;</component>
+    <component name="second"><component name="inner">x</component></component>
+    <component name="empty"/>
+</components>
+"""
+
+
+class FlangLibraryTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.library_path = os.path.join(self.directory.name, "lib.flang.xml")
+
+        with open(self.library_path, "w") as f:
+            f.write(LIBRARY_TEMPLATE)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_library_is_only_indexed(self):
+        library = FlangParser(lazy_libraries=True).parse_library(self.library_path)
+
+        self.assertEqual(library.names(), ["first", "second", "empty"])
+        self.assertEqual(library.components, {})
+
+    def test_only_referenced_component_is_built(self):
+        main_path = os.path.join(self.directory.name, "main.flang.xml")
+
+        with open(main_path, "w") as f:
+            f.write(f'<component name="main"><use ref="{self.library_path}:second.inner"/></component>')
+
+        parser = FlangParser(lazy_libraries=True)
+        parser.parse_file(main_path)
+
+        self.assertEqual(list(parser.libraries[self.library_path].components), ["second"])
+        self.assertIn(f"{self.library_path}:second.inner", parser.symbol_table)
+        self.assertNotIn(f"{self.library_path}:first", parser.symbol_table)
+
+    def write_main(self, reference: str) -> str:
+        main_path = os.path.join(self.directory.name, "main.flang.xml")
+
+        with open(main_path, "w") as f:
+            f.write(f'<component name="main">[<use ref="{reference}"/>]</component>')
+
+        return main_path
+
+    def test_plain_template_dependency_is_loaded_whole(self):
+        template_path = os.path.join(self.directory.name, "lib.xml")
+
+        with open(template_path, "w") as f:
+            f.write('<component name="lib"><component name="inner">x</component></component>')
+
+        parser = FlangParser(lazy_libraries=True)
+        flang_object = parser.parse_file(self.write_main(f"{template_path}:lib"))
+
+        self.assertNotIn(template_path, parser.libraries)
+        self.assertEqual(FlangTextProcessor(flang_object).run("[x]").position.end, 3)
+
+    def test_library_components_are_registered_with_the_library(self):
+        parser = FlangParser(lazy_libraries=True)
+        main_path = self.write_main(f"{self.library_path}:first")
+        parser.parse_file(main_path)
+
+        self.assertIs(parser.flang_objects[self.library_path], parser.libraries[self.library_path].loaded)
+        self.assertEqual(parser.dependencies(main_path), [self.library_path])
+        self.assertEqual(parser.dependents(self.library_path), [main_path])
+
+    def test_cycle_through_library_is_reported(self):
+        main_path = os.path.join(self.directory.name, "main.flang.xml")
+
+        with open(self.library_path, "w") as f:
+            f.write(f'<components><component name="first"><use ref="{main_path}:main"/></component></components>')
+
+        with self.assertRaises(FlangDependencyCycleError):
+            FlangParser(lazy_libraries=True).parse_file(self.write_main(f"{self.library_path}:first"))
+
+    def test_changed_library_is_reloaded(self):
+        parser = FlangParser(lazy_libraries=True)
+        main = parser.parse_file(self.write_main(f"{self.library_path}:second.inner"))
+
+        with open(self.library_path, "w") as f:
+            f.write(LIBRARY_TEMPLATE.replace(">x<", ">y<"))
+
+        parser.reload(self.library_path)
+
+        self.assertEqual(FlangTextProcessor(main).run("[y]").position.end, 3)
+        self.assertIsNone(FlangTextProcessor(main).run("[x]"))
@@ -0,0 +1,43 @@
+import os
+import tempfile
+from unittest import TestCase
+from flang_parser2 import FlangParser
+from utils.linker import FlangLinkError
+from test.test_processors import REFERENCE_TEMPLATE
+
+BROKEN_TEMPLATE = "".join(
+    [
+        '<component name="root">',
+        '<component name="digits" type="definition"><predicate pattern="\\d+"/></component>',
+        '<component name="digits" type="definition"><predicate pattern="[0-9]+"/></component>',
+        '<use ref=".digits"/><use ref=".missing"/><use ref="{}:missing"/>',
+        "</component>",
+    ]
+)
+
+
+class LinkerTestCase(TestCase):
+    def test_references_point_to_their_targets(self):
+        flang_object = FlangParser().parse_text(REFERENCE_TEMPLATE, evaluate=False)
+        targets = [
+            construct.target for construct in flang_object.root_component.children if hasattr(construct, "target")
+        ]
+
+        self.assertEqual(len(targets), 2)
+        self.assertTrue(all(target is flang_object.symbols["root.digits"] for target in targets))
+
+    def test_all_broken_references_are_reported_together(self):
+        with tempfile.TemporaryDirectory() as directory:
+            dependency_path = os.path.join(directory, "dep.flang.xml")
+
+            with open(dependency_path, "w") as f:
+                f.write('<component name="lib">x</component>')
+
+            with self.assertRaises(FlangLinkError) as context:
+                FlangParser().parse_text(BROKEN_TEMPLATE.replace("{}", dependency_path))
+
+        problems = context.exception.problems
+        self.assertEqual(len(problems), 3)
+        self.assertIn("root.digits defined more than once", problems[0])
+        self.assertIn("cannot find object .missing", problems[1])
+        self.assertIn(":missing", problems[2])
@@ -0,0 +1,128 @@
+import os
+import tempfile
+from unittest import TestCase
+from flang_parser2 import FlangParser, FlangTextProcessor
+from utils.linker import FlangLinkError
+from utils.loader import FlangDependencyCycleError, find_cycle
+
+
+class TemplateDirectoryTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name: str, template: str) -> str:
+        path = os.path.join(self.directory.name, f"{name}.flang.xml")
+
+        with open(path, "w") as f:
+            f.write(template.replace("{dir}", self.directory.name))
+
+        return path
+
+
+class DependencyLoadingTestCase(TemplateDirectoryTestCase):
+    def test_shared_dependency_is_parsed_once(self):
+        self.write("shared", '<component name="digits"><predicate name="v" pattern="\\d+"/></component>')
+
+        for name in ("left", "right"):
+            self.write(name, f'<component name="{name}"><use ref="{{dir}}/shared.flang.xml:digits"/></component>')
+
+        main = self.write(
+            "main",
+            '<component name="main"><use ref="{dir}/left.flang.xml:left"/>'
+            '-<use ref="{dir}/right.flang.xml:right"/></component>',
+        )
+
+        for workers, processes in ((None, False), (2, True)):
+            parser = FlangParser(load_workers=workers, load_in_processes=processes)
+            flang_object = parser.parse_file(main)
+
+            self.assertEqual(len(parser.flang_objects), 4)
+            self.assertEqual(FlangTextProcessor(flang_object).run("1-2").position.end, 3)
+
+    def test_dependencies_are_optimized_with_the_root(self):
+        self.write("choice", '<component name="either" join="|"><predicate name="v" pattern="\\d+"/>x</component>')
+        self.write("lib", '<component name="lib">(<use ref="{dir}/choice.flang.xml:either"/>)</component>')
+        main = self.write("main", '<component name="main"><use ref="{dir}/lib.flang.xml:lib"/></component>')
+        parser = FlangParser()
+        parser.parse_file(main)
+        dependency = parser.flang_objects[os.path.join(self.directory.name, "lib.flang.xml")]
+
+        self.assertIsNotNone(dependency.root_component.match_plan)
+        self.assertIsNotNone(parser.symbol_table[f"{self.directory.name}/choice.flang.xml:either"].choice_index)
+        self.assertEqual(len(parser.optimized_files), 3)
+
+    def test_cycle_is_reported_with_its_path(self):
+        self.write("a", '<component name="a"><use ref="{dir}/b.flang.xml:b"/></component>')
+        self.write("b", '<component name="b">x<use ref="{dir}/c.flang.xml:c"/></component>')
+        self.write("c", '<component name="c">y<use ref="{dir}/b.flang.xml:b"/></component>')
+
+        with self.assertRaises(FlangDependencyCycleError) as context:
+            FlangParser().parse_file(os.path.join(self.directory.name, "a.flang.xml"))
+
+        self.assertEqual(
+            [os.path.basename(path) for path in context.exception.cycle],
+            ["b.flang.xml", "c.flang.xml", "b.flang.xml"],
+        )
+
+    def test_failed_link_leaves_parser_clean(self):
+        self.write("shared", '<component name="digits"><predicate name="v" pattern="\\d+"/></component>')
+        left = self.write("left", '<component name="left"><use ref="{dir}/shared.flang.xml:missing"/></component>')
+        main = self.write("main", '<component name="main"><use ref="{dir}/left.flang.xml:left"/></component>')
+        parser = FlangParser()
+
+        for path in (main, left):
+            with self.assertRaises(FlangLinkError):
+                parser.parse_file(path)
+
+            self.assertFalse({main, left} & parser.flang_objects.keys())
+            self.assertFalse([symbol for symbol in parser.symbol_table if symbol.startswith((main, left))])
+
+        self.write("left", '<component name="left"><use ref="{dir}/shared.flang.xml:digits"/></component>')
+
+        self.assertEqual(FlangTextProcessor(parser.parse_file(main)).run("12").position.end, 2)
+
+
+class FindCycleTestCase(TestCase):
+    def test_diamond_and_self_import_are_not_cycles(self):
+        self.assertIsNone(find_cycle({"a": ["b", "c"], "b": ["d"], "c": ["d"], "d": ["d"]}))
+
+    def test_cycle_path(self):
+        self.assertEqual(find_cycle({"a": ["b"], "b": ["c"], "c": ["a"]}), ["a", "b", "c", "a"])
+
+
+class ReloadTestCase(TemplateDirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dependency = self.write("dep", '<component name="lib">x<predicate name="v" pattern="\\d+"/></component>')
+        self.main = self.write("main", '<component name="main">a <use ref="{dir}/dep.flang.xml:lib"/></component>')
+        self.parser = FlangParser()
+        self.parser.parse_file(self.main)
+
+    def test_reload_relinks_dependent_files(self):
+        self.write("dep", '<component name="lib">y<predicate name="v" pattern="\\d+"/></component>')
+        self.parser.reload(self.dependency)
+        main = self.parser.flang_objects[self.main]
+
+        self.assertEqual(self.parser.dependents(self.dependency), [self.main])
+        self.assertIsNone(FlangTextProcessor(main).run("a x1"))
+        self.assertEqual(FlangTextProcessor(main).run("a y1").position.end, 4)
+
+    def test_broken_reload_keeps_old_version(self):
+        self.write("dep", '<component name="renamed">y</component>')
+
+        with self.assertRaises(FlangLinkError):
+            self.parser.reload(self.dependency)
+
+        self.assertEqual(FlangTextProcessor(self.parser.flang_objects[self.main]).run("a x1").position.end, 4)
+
+    def test_poll_changes_reloads_modified_files(self):
+        self.assertEqual(self.parser.poll_changes(), [])
+
+        self.write("dep", '<component name="lib">y<predicate name="v" pattern="\\d+"/></component>')
+        os.utime(self.dependency, ns=(0, 0))
+
+        self.assertEqual(self.parser.poll_changes(), [self.dependency])
+        self.assertEqual(self.parser.poll_changes(), [])
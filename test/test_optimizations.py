@@ -0,0 +1,32 @@
+from unittest import TestCase
+from flang_parser2 import FlangParser, FlangTextProcessor
+from utils.dataclasses import FusedSegment
+
+IMPORT_TEMPLATE = """
+<component name="import">
+from <predicate name="module" pattern="{vname}"/> import <predicate name="object" pattern="{vname}"/>
+</component>
+"""
+
+
+class FusionTestCase(TestCase):
+    def test_component_is_fused(self):
+        flang_object = FlangParser().parse_text(IMPORT_TEMPLATE)
+        plan = flang_object.root_component.match_plan
+
+        self.assertEqual(len(plan), 1)
+        self.assertIsInstance(plan[0], FusedSegment)
+
+    def test_fused_match_equals_tree_walk(self):
+        fused = FlangTextProcessor(FlangParser().parse_text(IMPORT_TEMPLATE))
+        walked = FlangTextProcessor(FlangParser().parse_text(IMPORT_TEMPLATE, evaluate=False))
+
+        for sample in ["from json import dumps", "from json importx dumps", "import x"]:
+            self.assertEqual(fused.run(sample), walked.run(sample))
+
+    def test_predicates_do_not_backtrack(self):
+        template = '<component name="c"><predicate name="a" pattern="\\w+"/>x</component>'
+        fused = FlangTextProcessor(FlangParser().parse_text(template))
+        walked = FlangTextProcessor(FlangParser().parse_text(template, evaluate=False))
+
+        self.assertEqual(fused.run("abcx"), walked.run("abcx"))
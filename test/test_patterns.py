@@ -0,0 +1,71 @@
+import pickle
+from unittest import TestCase
+from flang_parser2 import FlangParser, FlangTextProcessor
+from utils.patterns import PATTERNS, PatternRegistry, UnknownPatternError
+from utils.helpers import AttributeInterner
+
+TEMPLATE = '<component name="a"><predicate name="x" pattern="{vname}"/>=<predicate name="y" pattern="{vname}"/></component>'
+
+
+class PatternRegistryTestCase(TestCase):
+    def test_same_pattern_is_compiled_once(self):
+        flang_object = FlangParser().parse_text(TEMPLATE, evaluate=False)
+        loaded = pickle.loads(pickle.dumps(flang_object))
+
+        self.assertIs(flang_object.symbols["a.x"].pattern, flang_object.symbols["a.y"].pattern)
+        self.assertIs(loaded.symbols["a.x"].pattern, flang_object.symbols["a.x"].pattern)
+
+    def test_user_defined_named_pattern(self):
+        registry = PatternRegistry()
+        fingerprint = registry.fingerprint
+        registry.register("hex", "0x[0-9a-f]+")
+
+        self.assertEqual(registry.compile("{hex}|{vname}").pattern, "0x[0-9a-f]+|[A-Za-z]\\w+")
+        self.assertNotEqual(registry.fingerprint, fingerprint)
+
+        registry.unregister("hex")
+        self.assertEqual(registry.fingerprint, fingerprint)
+        self.assertRaises(UnknownPatternError, registry.compile, "{hex}")
+
+    def test_registry_keeps_recently_used_patterns(self):
+        registry = PatternRegistry(max_size=2)
+        first = registry.intern("a")
+        registry.intern("b")
+        registry.intern("a")
+        registry.intern("c")
+
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.intern("a"), first)
+
+    def test_registered_pattern_is_used_by_predicates(self):
+        PATTERNS.register("test_hex", "0x[0-9a-f]+")
+        self.addCleanup(PATTERNS.unregister, "test_hex")
+        template = '<component name="a"><predicate name="v" pattern="{test_hex}"/></component>'
+
+        self.assertEqual(FlangTextProcessor(FlangParser().parse_text(template)).run("0x1f").end, 4)
+
+
+class AttributeInterningTestCase(TestCase):
+    def test_constructs_share_equal_attributes_and_have_no_dict(self):
+        template = (
+            '<component name="root"><component name="a"><predicate name="v" pattern="\\d+"/></component>'
+            '<component name="b"><predicate name="v" pattern="\\d+"/></component></component>'
+        )
+        flang_object = FlangParser().parse_text(template)
+        loaded = pickle.loads(pickle.dumps(flang_object))
+
+        self.assertIs(flang_object.symbols["root.a.v"].attributes, flang_object.symbols["root.b.v"].attributes)
+        self.assertIs(loaded.symbols["root.a.v"].attributes, loaded.symbols["root.b.v"].attributes)
+        self.assertFalse(any(hasattr(construct, "__dict__") for construct in flang_object.symbols.values()))
+        self.assertFalse(hasattr(flang_object, "__dict__"))
+
+    def test_table_keeps_recently_used_attributes(self):
+        interner = AttributeInterner(max_size=2)
+        first = interner.intern({"name": "a"})
+        interner.intern({"name": "b"})
+        interner.intern({"name": "a"})
+        interner.intern({"name": "c"})
+
+        self.assertEqual(len(interner), 2)
+        self.assertIs(interner.intern({"name": "a"}), first)
+        self.assertEqual(list(interner.table), [(("name", "c"),), (("name", "a"),)])
@@ -0,0 +1,203 @@
+import json
+import pickle
+from unittest import TestCase
+from flang_parser2 import FlangParser, FlangTextProcessor, TemplateSet
+from test.test_optimizations import IMPORT_TEMPLATE
+
+REFERENCE_TEMPLATE = "".join(
+    [
+        '<component name="root">',
+        '<component name="digits" type="definition"><predicate name="v" pattern="\\d+"/></component>',
+        '<use ref=".digits"/>x<use ref=".digits"/>',
+        "</component>",
+    ]
+)
+
+CHOICE_TEMPLATE = "".join(
+    [
+        '<component name="root">',
+        '<component name="digits" type="definition"><predicate name="v" pattern="\\d+"/></component>',
+        '<choice name="statement">',
+        '<component name="call"><use ref=".digits"/><predicate pattern="\\(\\)"/></component>',
+        '<component name="index"><use ref=".digits"/><predicate pattern="\\[\\]"/></component>',
+        '<component name="keyword"><predicate pattern="let"/></component>',
+        '<predicate name="word" pattern="[a-z]+"/>',
+        "</choice>",
+        "</component>",
+    ]
+)
+
+
+class MemoizationTestCase(TestCase):
+    def test_references_are_resolved_in_enclosing_scope(self):
+        flang_object = FlangParser().parse_text(REFERENCE_TEMPLATE)
+        digits = flang_object.find_refrenced_object(".digits", "root.some.nested")
+
+        self.assertIs(digits, flang_object.symbols["root.digits"])
+
+    def test_memoized_run_matches_like_plain_run(self):
+        flang_object = FlangParser().parse_text(REFERENCE_TEMPLATE)
+        memoized = FlangTextProcessor(flang_object, memoize=True)
+
+        self.assertEqual(memoized.run("12x3"), FlangTextProcessor(flang_object).run("12x3"))
+        self.assertEqual(memoized.run("12x3").position.end, 4)
+        self.assertEqual(memoized.memo_hits, 0)
+
+    def test_repeated_position_is_served_from_memo(self):
+        flang_object = FlangParser().parse_text(CHOICE_TEMPLATE)
+        memoized = FlangTextProcessor(flang_object, memoize=True)
+        memoized.run("12[]")  # both alternatives match digits at position 0
+
+        self.assertEqual(memoized.memo_hits, 1)
+        self.assertIsNone(memoized.memo)
+
+
+class ChoiceTestCase(TestCase):
+    def setUp(self):
+        self.flang_object = FlangParser().parse_text(CHOICE_TEMPLATE)
+        self.processor = FlangTextProcessor(self.flang_object)
+
+    def test_first_matching_alternative_wins(self):
+        statement = self.processor.run("letter").spec_or_matched["statement"]
+
+        self.assertEqual(list(statement.spec_or_matched), ["keyword"])
+        self.assertEqual(self.processor.run("12[]").position.end, 4)
+        self.assertIsNone(self.processor.run("?"))
+
+    def test_index_skips_alternatives_by_first_character(self):
+        index = self.flang_object.symbols["root.statement"].choice_index
+
+        self.assertEqual([alt.symbol for alt in index.candidates("1", 0)], ["call", "index"])
+        self.assertEqual([alt.symbol for alt in index.candidates("l", 0)], ["keyword", "word"])
+        self.assertEqual(index.candidates("?", 0), ())
+
+    def test_index_gives_same_results_as_trying_all_alternatives(self):
+        unindexed = FlangTextProcessor(FlangParser().parse_text(CHOICE_TEMPLATE, evaluate=False))
+
+        for sample in ["1()", "1[]", "let", "abc", "", "?", "ł"]:
+            self.assertEqual(self.processor.run(sample), unindexed.run(sample))
+
+
+class TemplateSetTestCase(TestCase):
+    TEMPLATES = {
+        "from-import": 'from <predicate name="module" pattern="{vname}"/> import <predicate name="object" pattern="{vname}"/>',
+        "import": 'import <predicate name="module" pattern="{vname}"/>',
+        "function": 'def <predicate name="name" pattern="{vname}"/>():',
+        "name": '<predicate name="name" pattern="{vname}"/>',
+    }
+
+    def setUp(self):
+        self.template_set = TemplateSet(
+            {
+                name: FlangParser().parse_text(f'<component name="{name}">{template}</component>')
+                for name, template in self.TEMPLATES.items()
+            }
+        )
+
+    def test_candidates_are_ranked_by_anchor_hits(self):
+        self.assertEqual(self.template_set.candidates("from json import dumps"), ["from-import", "import", "name"])
+        self.assertEqual(self.template_set.candidates("def main():"), ["function", "name"])
+
+    def test_classify_returns_first_matching_template(self):
+        [(name, match_object)] = self.template_set.classify("import json")
+
+        self.assertEqual(name, "import")
+        self.assertEqual(match_object.spec_or_matched["module"].spec_or_matched, "json")
+        self.assertEqual(
+            [name for name, _ in self.template_set.classify("from ab import cd", first_only=False)],
+            ["from-import", "name"],
+        )
+
+
+class FlangMatchObjectTestCase(TestCase):
+    def test_match_objects_share_the_sample(self):
+        sample = "from json import dumps"
+        match_object = FlangTextProcessor(FlangParser().parse_text(IMPORT_TEMPLATE)).run(sample)
+
+        self.assertIs(match_object["module"].source, sample)
+        self.assertEqual((match_object["module"].start, match_object["module"].end), (5, 9))
+        self.assertEqual(match_object.to_dict(), {"module": "json", "object": "dumps"})
+
+    def test_flat_dict_uses_dotted_keys(self):
+        match_object = FlangTextProcessor(FlangParser().parse_text(CHOICE_TEMPLATE)).run("12()")
+
+        self.assertEqual(match_object.to_dict(), {"statement": {"call": {"digits": {"v": "12"}}}})
+        self.assertEqual(match_object.to_flat_dict(), {"statement.call.digits.v": "12"})
+        self.assertEqual(
+            FlangTextProcessor(FlangParser().parse_text(CHOICE_TEMPLATE)).run("abc").to_flat_dict(),
+            {"statement.word": "abc"},
+        )
+
+
+class FlangMatchTapeTestCase(TestCase):
+    SAMPLES = ["12()", "abc", "let"]
+
+    def test_tape_conversions_equal_match_object_conversions(self):
+        flang_object = FlangParser().parse_text(CHOICE_TEMPLATE)
+        processor, tape_processor = FlangTextProcessor(flang_object), FlangTextProcessor(flang_object, tape=True)
+
+        for sample in self.SAMPLES:
+            match_object, tape = processor.run(sample), tape_processor.run(sample)
+
+            self.assertEqual(tape.to_dict(), match_object.to_dict())
+            self.assertEqual(tape.to_flat_dict(), match_object.to_flat_dict())
+            self.assertEqual(json.loads(tape.to_json()), match_object.to_dict())
+
+    def test_tape_survives_pickling(self):
+        tape = FlangTextProcessor(FlangParser().parse_text(IMPORT_TEMPLATE), tape=True).run("from a1 import b2")
+
+        self.assertEqual(len(tape), 3)
+        self.assertEqual(pickle.loads(pickle.dumps(tape)).to_flat_dict(), {"module": "a1", "object": "b2"})
+
+
+class CompiledMatcherTestCase(TestCase):
+    SAMPLES = ["12()", "12[]", "abc", "let", "12", "()"]
+
+    def test_compiled_matcher_matches_like_dispatch(self):
+        for evaluate in (True, False):
+            flang_object = FlangParser().parse_text(CHOICE_TEMPLATE, evaluate=evaluate)
+            compiled, dispatched = FlangTextProcessor(flang_object), FlangTextProcessor(flang_object, compiled=False)
+
+            for sample in self.SAMPLES:
+                self.assertEqual(compiled.run(sample), dispatched.run(sample))
+
+    def test_fused_root_matches_like_dispatch(self):
+        flang_object = FlangParser().parse_text(IMPORT_TEMPLATE)
+        compiled, dispatched = FlangTextProcessor(flang_object), FlangTextProcessor(flang_object, compiled=False)
+
+        for sample in ["from json import dumps", "from json import", "import json"]:
+            self.assertEqual(compiled.run(sample), dispatched.run(sample))
+
+    def test_compiled_matcher_is_memoized(self):
+        memoized = FlangTextProcessor(FlangParser().parse_text(CHOICE_TEMPLATE), memoize=True)
+        memoized.run("12[]")
+
+        self.assertEqual(memoized.memo_hits, 1)
+
+    def test_processor_is_picklable_after_compiling(self):
+        processor = FlangTextProcessor(FlangParser().parse_text(IMPORT_TEMPLATE))
+        processor.run("from a1 import b2")
+        copy = pickle.loads(pickle.dumps(processor))
+
+        self.assertEqual(copy.run("from a1 import b2").to_flat_dict(), {"module": "a1", "object": "b2"})
+
+
+class ProfilingTestCase(TestCase):
+    def test_constructs_are_counted(self):
+        processor = FlangTextProcessor(FlangParser().parse_text(CHOICE_TEMPLATE), profile=True)
+
+        for sample in ["12()", "12[]", "abc"]:
+            processor.run(sample)
+
+        stats = processor.profiler.stats
+        self.assertEqual((stats["root"].attempts, stats["root"].successes), (3, 3))
+        self.assertEqual((stats["root.statement.call"].attempts, stats["root.statement.call"].failures), (2, 1))
+        self.assertEqual(stats["root.statement.word"].characters, 3)
+        self.assertEqual(json.loads(processor.profiler.to_json())["root"]["attempts"], 3)
+        self.assertTrue(processor.profiler.report().startswith("construct"))
+
+    def test_profiling_is_off_by_default(self):
+        processor = FlangTextProcessor(FlangParser().parse_text(CHOICE_TEMPLATE))
+        processor.run("12()")
+
+        self.assertIsNone(processor.profiler)
@@ -0,0 +1,109 @@
+from unittest import TestCase
+from flang_parser2 import FlangParser, FlangTextProcessor, FlangGenerationProcessor
+from utils.anchors import mandatory_literals
+from utils.generation import GenerationError
+
+REPETITION_TEMPLATE = "".join(
+    [
+        '<component name="file">',
+        '<component name="imports" prod-rule="*">',
+        'from <predicate name="module" pattern="{vname}"/> import <predicate name="object" pattern="{vname}"/>',
+        '<predicate pattern="\\n"/>',
+        "</component>",
+        '<component name="alias" prod-rule="?">as <predicate name="name" pattern="{vname}"/></component>',
+        '<component name="end" prod-rule="+">;</component>',
+        "</component>",
+    ]
+)
+SAMPLE = "from json import dumps\nfrom os import path\nas xx;;"
+
+
+class RepetitionTestCase(TestCase):
+    def setUp(self):
+        self.flang_object = FlangParser().parse_text(REPETITION_TEMPLATE)
+
+    def test_iterations_are_stored_under_indexes(self):
+        for compiled in (True, False):
+            match_object = FlangTextProcessor(self.flang_object, compiled=compiled).run(SAMPLE)
+
+            self.assertEqual(match_object.end, len(SAMPLE))
+            self.assertEqual(
+                match_object.to_flat_dict(),
+                {
+                    "imports.0.module": "json",
+                    "imports.0.object": "dumps",
+                    "imports.1.module": "os",
+                    "imports.1.object": "path",
+                    "alias.name": "xx",
+                },
+            )
+
+    def test_optional_and_required_repetitions(self):
+        processor = FlangTextProcessor(self.flang_object)
+
+        self.assertEqual(processor.run(";").to_dict(), {"imports": {}, "alias": {}, "end": {"0": {}}})
+        self.assertIsNone(processor.run("from json import dumps\n"))
+        self.assertIsNone(processor.run(""))
+
+    def test_many_iterations(self):
+        sample = "".join(f"from module{i} import name{i}\n" for i in range(500)) + ";"
+        match_object = FlangTextProcessor(self.flang_object).run(sample)
+
+        self.assertEqual(len(match_object["imports"].spec), 500)
+        self.assertEqual(match_object["imports"]["499"]["module"].matched, "module499")
+
+    def test_generation_round_trip(self):
+        generator = FlangGenerationProcessor(self.flang_object)
+        spec = FlangTextProcessor(self.flang_object).run(SAMPLE).to_flat_dict()
+
+        self.assertEqual(generator.run(spec), "from json import dumps\nfrom os import path\nas xx;")
+        self.assertEqual(generator.run({}), ";")
+
+    def test_required_repetition_needs_an_iteration(self):
+        template = '<component name="a"><component name="b" prod-rule="+"><predicate name="v" pattern="x"/></component></component>'
+        generator = FlangGenerationProcessor(FlangParser().parse_text(template))
+
+        self.assertEqual(generator.run({"b.0.v": "x", "b.1.v": "x"}), "xx")
+        self.assertRaises(GenerationError, generator.run, {})
+
+    def test_optional_component_can_be_skipped_by_choices_and_anchors(self):
+        template = (
+            '<component name="root" join="|">'
+            '<component name="a"><component prod-rule="?">pre</component>ab</component>'
+            '<component name="b">x</component>'
+            "</component>"
+        )
+        flang_object = FlangParser().parse_text(template)
+
+        self.assertEqual(FlangTextProcessor(flang_object).run("ab").end, 2)
+        self.assertEqual(mandatory_literals(self.flang_object, min_length=1), {";"})
+
+    def test_anonymous_repetitions_keep_their_captures(self):
+        template = (
+            '<component name="file">'
+            '<component prod-rule="?">from <predicate name="module" pattern="{vname}"/> </component>'
+            'import <predicate name="object" pattern="{vname}"/>:'
+            '<component prod-rule="*"><predicate name="head" pattern="[a-z]"/><predicate name="tail" pattern="[a-z]"/>;</component>'
+            "</component>"
+        )
+        flang_object = FlangParser().parse_text(template)
+        generator = FlangGenerationProcessor(flang_object)
+        sample = "from os import path:ab;cd;"
+
+        for compiled in (True, False):
+            match_object = FlangTextProcessor(flang_object, compiled=compiled).run(sample)
+
+            self.assertEqual(
+                match_object.to_flat_dict(),
+                {
+                    "module": "os",
+                    "object": "path",
+                    "0.head": "a",
+                    "0.tail": "b",
+                    "1.head": "c",
+                    "1.tail": "d",
+                },
+            )
+            self.assertEqual(generator.run(match_object.to_flat_dict()), sample)
+
+        self.assertEqual(generator.run({"object": "path"}), "import path:")
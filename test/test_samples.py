@@ -0,0 +1,40 @@
+import os
+import tempfile
+from unittest import TestCase
+from utils.samples import FlangSampleStore, SQLiteSampleStore
+
+
+class FlangSampleStoreTestCase(TestCase):
+    def create_store(self):
+        return FlangSampleStore()
+
+    def setUp(self):
+        self.store = self.create_store()
+
+        for module, obj in [("json", "dumps"), ("json", "loads"), ("os", "path"), ("os", "dumps")]:
+            self.store.add({"module": module, "object": obj})
+
+    def test_most_similar_counts_shared_pairs(self):
+        self.assertEqual(self.store.most_similar({"module": "os", "object": "dumps"}, k=2), [(3, 2), (0, 1)])
+
+    def test_ties_prefer_earlier_samples(self):
+        self.assertEqual(self.store.most_similar({"module": "json"}), [(0, 1)])
+        self.assertEqual(self.store.most_similar({"unknown": "key"}), [(0, 0)])
+
+
+class SQLiteSampleStoreTestCase(FlangSampleStoreTestCase):
+    def create_store(self):
+        self.directory = tempfile.TemporaryDirectory()
+        return SQLiteSampleStore(os.path.join(self.directory.name, "samples.db"))
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_samples_survive_reopening(self):
+        self.store.close()
+        self.store = SQLiteSampleStore(os.path.join(self.directory.name, "samples.db"))
+
+        self.assertEqual(len(self.store), 4)
+        self.assertEqual(self.store[2], {"module": "os", "object": "path"})
+        self.assertEqual(self.store.add({"module": "sys"}), 4)
@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+from test.test_loader import TemplateDirectoryTestCase
+from flang_parser2 import FlangParser
+from utils.scan import FileMatcher, walk_files
+
+IMPORT_TEMPLATE = (
+    '<component name="import">from <predicate name="module" pattern="{vname}"/>'
+    ' import <predicate name="object" pattern="{vname}"/></component>'
+)
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ScanTestCase(TemplateDirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.template = self.write("import", IMPORT_TEMPLATE)
+        self.source = os.path.join(self.directory.name, "src")
+
+        for relative_path, text in {
+            "main.py": "import os\nfrom json import dumps\nx = 1\nfrom os import path",
+            "notes.txt": "from json import dumps",
+            "node_modules/vendored.py": "from json import dumps",
+            "pkg/module.py": "from typing import Iterable",
+        }.items():
+            path = os.path.join(self.source, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(path, "w") as f:
+                f.write(text)
+
+    def test_walk_files_with_globs(self):
+        found = walk_files(self.source, include=["*.py"], exclude=["node_modules"])
+
+        self.assertEqual(
+            sorted(os.path.relpath(path, self.source) for path in found),
+            ["main.py", os.path.join("pkg", "module.py")],
+        )
+
+    def test_file_matcher_reports_lines_and_errors(self):
+        matcher = FileMatcher(FlangParser().parse_file(self.template), lines=True, flat=True)
+        result = matcher.run(os.path.join(self.source, "main.py"))
+        missing = matcher.run(os.path.join(self.source, "missing.py"))
+
+        self.assertEqual([record["line"] for record in result.records], [2, 4])
+        self.assertEqual(result.records[1]["match"], {"module": "os", "object": "path"})
+        self.assertTrue(missing.records[0]["error"].startswith("FileNotFoundError"))
+
+    def test_command_line_streams_json_lines(self):
+        completed = subprocess.run(
+            [sys.executable, ".", self.template, self.source, "--include", "*.py", "--exclude", "node_modules",
+             "--lines", "--jobs", "2", "--chunk-size", "1"],
+            cwd=REPOSITORY, capture_output=True, text=True,
+        )
+        records = [json.loads(line) for line in completed.stdout.splitlines()]
+
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual(
+            sorted(record["match"]["object"] for record in records), ["Iterable", "dumps", "path"]
+        )
+        self.assertIn("2 files, 3 matches, 0 errors", completed.stderr)
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+from utils.server import FlangServer
+
+IMPORT_TEMPLATE = (
+    '<component name="import">from <predicate name="module" pattern="{vname}"/>'
+    ' import <predicate name="object" pattern="{vname}"/></component>'
+)
+
+
+class FlangServerTestCase(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.template = os.path.join(self.directory.name, "import.flang.xml")
+
+        with open(self.template, "w") as f:
+            f.write(IMPORT_TEMPLATE)
+
+        self.server = FlangServer()
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        self.directory.cleanup()
+
+    async def test_match_and_generate(self):
+        matched = await self.server.handle({"id": 1, "template": self.template, "sample": "from json import dumps"})
+        generated = await self.server.handle(
+            {"id": 2, "op": "generate", "template": self.template, "spec": {"module": "json", "object": "dumps"}}
+        )
+
+        self.assertEqual(matched, {"id": 1, "result": {"module": "json", "object": "dumps"}, "error": None})
+        self.assertEqual(generated["result"], "from json import dumps")
+
+    async def test_concurrent_requests_are_batched(self):
+        responses = await asyncio.gather(
+            *(self.server.handle({"id": i, "template": self.template, "sample": f"from m{i} import obj"}) for i in range(100))
+        )
+        stats = (await self.server.handle({"op": "stats"}))["result"]
+
+        self.assertEqual([response["result"]["module"] for response in responses], [f"m{i}" for i in range(100)])
+        self.assertEqual(stats["requests"], 100)
+        self.assertLess(stats["batches"], 10)
+
+    async def test_errors_are_returned(self):
+        unknown = await self.server.handle({"op": "delete", "template": self.template})
+        missing = await self.server.handle({"template": self.template + ".missing", "sample": ""})
+        generated = await self.server.handle({"op": "generate", "template": self.template, "spec": {}})
+
+        self.assertTrue(unknown["error"].startswith("ValueError"))
+        self.assertTrue(missing["error"].startswith("FileNotFoundError"))
+        self.assertTrue(generated["error"].startswith("GenerationError"))
+        self.assertEqual(self.server.stats.errors, 3)
+
+    async def test_reloaded_template_is_served(self):
+        await self.server.handle({"op": "load", "template": self.template})
+
+        with open(self.template, "w") as f:
+            f.write(IMPORT_TEMPLATE.replace("import", "use"))
+
+        os.utime(self.template, ns=(0, 0))
+        self.server.parser.poll_changes(self.server.invalidate)
+        response = await self.server.handle({"template": self.template, "sample": "from json use dumps"})
+
+        self.assertEqual(response["result"], {"module": "json", "object": "dumps"})
+
+    async def test_json_lines_over_unix_socket(self):
+        path = os.path.join(self.directory.name, "server.sock")
+
+        async with await self.server.serve_unix(path):
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b"not json\n")
+            writer.write(json.dumps({"id": 7, "template": self.template, "sample": "from json import dumps"}).encode() + b"\n")
+            responses = sorted(
+                [json.loads(await reader.readline()) for _ in range(2)], key=lambda response: response["id"] or 0
+            )
+            writer.close()
+            await writer.wait_closed()
+
+        self.assertTrue(responses[0]["error"].startswith("ValueError"))
+        self.assertEqual(responses[1]["result"], {"module": "json", "object": "dumps"})
+
+    async def test_workers_load_the_template_once(self):
+        await self.server.close()
+        self.server = FlangServer(workers=1)
+        await self.server.start()
+        sent = []
+        submit = self.server.executor.submit
+        self.server.executor.submit = lambda function, *args: sent.append(len(args)) or submit(function, *args)
+
+        for i in range(3):
+            response = await self.server.handle({"template": self.template, "sample": f"from m{i} import obj"})
+            self.assertEqual(response["result"], {"module": f"m{i}", "object": "obj"})
+
+        # first batch is sent again with the processor, later ones only with the key
+        self.assertEqual(sent, [2, 3, 2, 2])
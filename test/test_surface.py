@@ -0,0 +1,58 @@
+from unittest import TestCase
+from flang_parser2 import FlangParser, FlangTextProcessor
+from utils.surface import FlangSurfaceParser, FlangSyntaxError
+from test.test_processors import CHOICE_TEMPLATE
+
+SURFACE_CHOICE_TEMPLATE = """
+{% defc ^name root
+{% defc ^name digits ^type definition {% defp ^name v "\\d+" %} %}
+{% defoc statement
+    {% defc call {% use digits %}{% defp "\\(\\)" %} %}
+    {% defc index {% use digits %}{% defp "\\[\\]" %} %}
+    {% defc keyword {% defp "let" %} %}
+    {% defp ^name word "[a-z]+" %}
+%}
+%}
+
+12() and everything below the template is ignored
+"""
+
+
+class FlangSurfaceParserTestCase(TestCase):
+    def test_blocks_are_parsed_with_positions(self):
+        tree = FlangSurfaceParser().parse('{% defc ^name import\nfrom {% defp module vname %} import *\n%}')
+        text, predicate, tail = tree.value
+
+        self.assertEqual((tree.name, tree.attributes), ("component", {"name": "import"}))
+        self.assertEqual(text.value, "from ")
+        self.assertEqual(predicate.attributes, {"name": "module", "pattern": "{vname}"})
+        self.assertEqual(predicate.position, (2, 5))
+        self.assertEqual(tail.value, " import *")
+
+    def test_surface_template_matches_like_xml_template(self):
+        surface = FlangParser().parse_text(SURFACE_CHOICE_TEMPLATE, "choice.flang")
+        xml = FlangParser().parse_text(CHOICE_TEMPLATE, "choice.flang.xml")
+
+        for sample in ["12()", "12[]", "let", "abc", "()"]:
+            self.assertEqual(FlangTextProcessor(surface).run(sample), FlangTextProcessor(xml).run(sample))
+
+    def test_syntax_error_points_to_the_block(self):
+        with self.assertRaises(FlangSyntaxError) as context:
+            FlangSurfaceParser().parse("{% defc ^name root\n  {% defp ^name v vname %}\n  {% defq %}\n%}")
+
+        self.assertEqual(context.exception.position, (3, 5))
+        self.assertRaises(FlangSyntaxError, FlangSurfaceParser().parse, "{% defc ^name root text")
+
+    def test_sample_templates_are_loaded(self):
+        flang_object = FlangParser().parse_file("lib/samples/javascript/react/main.flang")
+
+        self.assertEqual(
+            [child.symbol for child in flang_object.root_component.children], ["import-statement", "react-component"]
+        )
+
+        # pattern of the filepath predicate names itself, it cannot be expanded
+        with self.assertRaises(FlangSyntaxError) as context:
+            FlangParser().parse_file("lib/samples/python/main.flang")
+
+        self.assertEqual(context.exception.position, (2, 9))
+        self.assertIn("{filepath}", str(context.exception))
@@ -0,0 +1,28 @@
+from unittest import TestCase
+from flang_parser2 import FlangXMLParser
+from utils.surface import FlangSyntaxError
+
+
+class FlangXMLParserTestCase(TestCase):
+    def test_elements_keep_direct_text_and_positions(self):
+        tree = FlangXMLParser().parse('<component name="a">\nx<component>y</component>z\n</component>')
+        text, child, tail = tree.value
+
+        self.assertEqual((text.value, tail.value), ("x", "z"))
+        self.assertEqual(child.value[0].value, "y")
+        self.assertEqual((tree.position, text.position, child.position), ((1, 0), (1, 20), (2, 1)))
+
+    def test_deep_nesting_does_not_recurse(self):
+        depth = 5000
+        tree = FlangXMLParser().parse("<component>" * depth + "x" + "</component>" * depth)
+
+        for _ in range(depth - 1):
+            [tree] = tree.value
+
+        self.assertEqual(tree.value[0].value, "x")
+
+    def test_malformed_xml_reports_position(self):
+        with self.assertRaises(FlangSyntaxError) as context:
+            FlangXMLParser().parse("<component>\n<predicate></component>")
+
+        self.assertEqual(context.exception.position.line, 2)
@@ -2,11 +2,7 @@ from abc import ABC, abstractmethod
 import re
 from typing import TypeVar
 
-BUILTIN_PATTERNS = {
-    "vname": r"[A-Za-z]\w+",
-    "number": r"-?(([1-9]+\d*)|0)(\.\d*)?",
-    "string": r"((?:\\)\"[^\"]*(?:\\)\")|((?:\\)'[^\']*(?:\\)')",
-}
+from utils.patterns import BUILTIN_PATTERNS
 
 T = TypeVar("T")
 
@@ -53,3 +53,21 @@ class FlangProcessor(abc.ABC):
     @abc.abstractmethod
     def output_type(self) -> type:
         ...
+
+
+class SampleStore(abc.ABC):
+    @abc.abstractmethod
+    def add(self, sample: dict[str, str]) -> int:
+        ...
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abc.abstractmethod
+    def __getitem__(self, sample_id: int) -> dict[str, str]:
+        ...
+
+    @abc.abstractmethod
+    def most_similar(self, spec: dict[str, str], k: int = 1) -> list[tuple[int, int]]:
+        ...
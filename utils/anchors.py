@@ -0,0 +1,115 @@
+from __future__ import annotations
+import collections
+from typing import Iterable
+
+from utils.dataclasses import FlangObject
+import utils.constructs as c
+
+OPTIONAL_PRODUCTION_RULES = ("*", "?")
+
+
+class AhoCorasick:
+    """
+    Finds all occurrences of many literal keywords in a single pass over the text,
+    independently of the number of keywords
+    """
+
+    def __init__(self, keywords: Iterable[str] = ()) -> None:
+        self.transitions: list[dict[str, int]] = [{}]
+        self.outputs: list[set[str]] = [set()]
+        self.fail: list[int] = [0]
+        self.compiled = True
+
+        for keyword in keywords:
+            self.add(keyword)
+
+    def add(self, keyword: str) -> None:
+        assert keyword, "Cannot index empty keyword"
+        state = 0
+
+        for char in keyword:
+            if char not in self.transitions[state]:
+                self.transitions.append({})
+                self.outputs.append(set())
+                self.fail.append(0)
+                self.transitions[state][char] = len(self.transitions) - 1
+            state = self.transitions[state][char]
+
+        self.outputs[state].add(keyword)
+        self.compiled = False
+
+    def compile(self) -> None:
+        queue = collections.deque(self.transitions[0].values())
+
+        for state in queue:
+            self.fail[state] = 0
+
+        while queue:
+            state = queue.popleft()
+
+            for char, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+
+                self.fail[next_state] = self.transitions[fallback].get(char, 0)
+                self.outputs[next_state] |= self.outputs[self.fail[next_state]]
+
+        self.compiled = True
+
+    def find_all(self, text: str) -> set[str]:
+        if not self.compiled:
+            self.compile()
+
+        transitions, fail, outputs = self.transitions, self.fail, self.outputs
+        found = set()
+        state = 0
+
+        for char in text:
+            while state and char not in transitions[state]:
+                state = fail[state]
+
+            state = transitions[state].get(char, 0)
+
+            if outputs[state]:
+                found |= outputs[state]
+
+        return found
+
+
+def mandatory_literals(flang_object: FlangObject, min_length: int = 2) -> set[str]:
+    """
+    Collects text that has to appear in every sample matched by the flang object.
+    Alternatives of choices and optional components are skipped
+    """
+    literals = set()
+    visited = set()
+
+    def visit(construct: c.BaseFlangConstruct):
+        if id(construct) in visited:
+            return
+
+        visited.add(id(construct))
+
+        if isinstance(construct, c.FlangRawText):
+            if len(literal := construct.value.strip()) >= min_length:
+                literals.add(literal)
+
+        elif isinstance(construct, c.FlangReference):
+            if construct.target is not None:
+                visit(construct.target)
+
+        elif isinstance(construct, c.FlangComponent):
+            if construct.is_choice:
+                return
+            if construct.prod_rule in OPTIONAL_PRODUCTION_RULES:
+                return
+
+            for child in construct.children:
+                if c.is_matchable(child):
+                    visit(child)
+
+    visit(flang_object.root_component)
+    return literals
@@ -0,0 +1,91 @@
+from __future__ import annotations
+import collections
+import concurrent.futures
+import itertools
+import os
+from typing import Iterable, Iterator
+
+from utils.abstracts import FlangProcessor
+from utils.dataclasses import FlangBatchResult
+
+# state of the worker process, initialized once per worker
+_worker_processor: FlangProcessor | None = None
+
+
+def _initialize_worker(processor: FlangProcessor) -> None:
+    global _worker_processor
+    _worker_processor = processor
+
+
+def run_chunk(
+    processor: FlangProcessor, chunk: list[tuple[int, any]], method: str = "run"
+) -> list[FlangBatchResult]:
+    results = []
+    run = getattr(processor, method)
+
+    for index, sample in chunk:
+        try:
+            results.append(FlangBatchResult(index=index, result=run(sample)))
+        except Exception as error:
+            results.append(FlangBatchResult(index=index, error=f"{type(error).__name__}: {error}"))
+
+    return results
+
+
+def _run_worker_chunk(chunk: list[tuple[int, any]], method: str) -> list[FlangBatchResult]:
+    return run_chunk(_worker_processor, chunk, method)
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def run_in_pool(
+    processor: FlangProcessor,
+    samples: Iterable,
+    workers: int | None = None,
+    chunksize: int = 256,
+    ordered: bool = True,
+    method: str = "run",
+) -> Iterator[FlangBatchResult]:
+    """
+    Runs the processor over samples using a pool of processes.
+    The processor is sent to every worker once, when the worker starts.
+    Only a bounded number of chunks is in flight, so samples can be a lazy stream
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = chunked(enumerate(samples), chunksize)
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from run_chunk(processor, chunk, method)
+        return
+
+    max_in_flight = workers * 2
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=_initialize_worker, initargs=(processor,)
+    ) as executor:
+        pending = collections.deque(
+            executor.submit(_run_worker_chunk, chunk, method)
+            for chunk in itertools.islice(chunks, max_in_flight)
+        )
+
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    pending.remove(future)
+
+            for future in done:
+                yield from future.result()
+
+            for chunk in itertools.islice(chunks, len(done)):
+                pending.append(executor.submit(_run_worker_chunk, chunk, method))
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Iterable
+
+from utils.dataclasses import FlangObject
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "flang"
+)
+
+
+def content_hash(*chunks: str) -> str:
+    digest = hashlib.sha256()
+
+    for chunk in chunks:
+        digest.update(chunk.encode())
+        digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+def file_hash(filepath: str) -> str | None:
+    try:
+        with open(filepath) as f:
+            return content_hash(f.read())
+    except OSError:
+        return None
+
+
+class _EntryPickler(pickle.Pickler):
+    """
+    Constructs of other files are left out of the entry, linking the loaded
+    object fills them in again
+    """
+
+    def __init__(self, file, flang_object: FlangObject) -> None:
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.external = {id(construct) for construct in flang_object.external_symbols.values()}
+
+    def persistent_id(self, obj: any) -> str | None:
+        return "external" if id(obj) in self.external else None
+
+
+class _EntryUnpickler(pickle.Unpickler):
+    def persistent_load(self, persistent_id: str) -> None:
+        return None
+
+
+class FlangObjectCache:
+    """
+    Content addressed storage of parsed flang objects.
+
+    Entries are keyed by the parser version and the text of the template. Together with
+    the object we store hashes of the files it depends on, so the entry is dropped
+    as soon as any of the dependencies changes. Optimized objects are built with
+    knowledge of the files their dependencies import, so they have to be stored
+    with all of the files they depend on, directly or not.
+    Entries are pickled, so the cache directory should never be shared with untrusted users
+    """
+
+    def __init__(self, directory: str | None = None, version: str = "") -> None:
+        self.directory = directory or os.environ.get("FLANG_CACHE_DIR", DEFAULT_CACHE_DIRECTORY)
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, text: str, *variant: str) -> str:
+        return content_hash(self.version, *variant, text)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def load(self, key: str) -> FlangObject | None:
+        try:
+            with open(self._entry_path(key), "rb") as f:
+                dependency_hashes, flang_object = _EntryUnpickler(f).load()
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+            self.misses += 1
+            return None
+
+        if any(file_hash(path) != digest for path, digest in dependency_hashes.items()):
+            self.invalidate(key)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return flang_object
+
+    def store(self, key: str, flang_object: FlangObject, dependencies: Iterable[str] | None = None) -> None:
+        """
+        Dependencies default to the files the object imports symbols from directly
+        """
+        if dependencies is None:
+            dependencies = (dependency.split(":")[0] for dependency in flang_object.external_dependencies)
+
+        dependency_hashes = {path: file_hash(path) for path in set(dependencies)}
+
+        # write to temporary file first, so concurrent readers never see partial entries
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                _EntryPickler(f, flang_object).dump((dependency_hashes, flang_object))
+            os.replace(temporary_path, self._entry_path(key))
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def invalidate(self, key: str) -> None:
+        try:
+            os.remove(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".pickle"):
+                os.remove(os.path.join(self.directory, filename))
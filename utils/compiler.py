@@ -0,0 +1,290 @@
+from __future__ import annotations
+from typing import Callable
+
+from utils.dataclasses import FlangObject, FlangMatchObject, FusedSegment
+from utils.profiling import MatchProfiler
+import utils.constructs as c
+
+Matcher = Callable[[str, int], FlangMatchObject | None]
+# step of a component, writes matched children into the spec and returns end position
+Step = Callable[[str, int, dict], int | None]
+
+
+class MatcherCompiler:
+    """
+    Walks the flang object once and turns every construct into a specialized closure.
+    Matching with the compiled closures does no dispatch and no isinstance checks,
+    definitions and rules are filtered out while compiling.
+
+    When memo_owner is given, components and choices are memoized in its memo
+    dictionary, which the owner resets for every run.
+    When profiler is given, every construct is wrapped to record its statistics
+    """
+
+    def __init__(
+        self, flang_object: FlangObject, memo_owner: any = None, profiler: MatchProfiler | None = None
+    ) -> None:
+        self.flang_object = flang_object
+        self.memo_owner = memo_owner
+        self.profiler = profiler
+        self.compiled: dict[int, Matcher] = {}
+        self.locations = (
+            {id(construct): location for location, construct in flang_object.symbols.items()}
+            if profiler
+            else {}
+        )
+
+    def compile(self, construct: c.BaseFlangConstruct) -> Matcher:
+        key = id(construct)
+
+        if key not in self.compiled:
+            # placeholder lets recursive references point to the not yet compiled matcher
+            cell: list[Matcher] = []
+            self.compiled[key] = lambda text, position: cell[0](text, position)
+            matcher = self._compile(construct)
+
+            if self.profiler is not None and not isinstance(construct, c.FlangReference):
+                matcher = self.profiler.wrap(self.location(construct), matcher)
+
+            if self.memo_owner is not None and isinstance(construct, (c.FlangComponent, c.FlangChoice)):
+                matcher = self._memoized(matcher, key)
+
+            cell.append(matcher)
+            self.compiled[key] = matcher
+
+        return self.compiled[key]
+
+    def location(self, construct: c.BaseFlangConstruct) -> str:
+        return self.locations.get(id(construct)) or type(construct).__name__
+
+    def _compile(self, construct: c.BaseFlangConstruct) -> Matcher:
+        if isinstance(construct, c.FlangRawText):
+            return self._compile_text(construct.value)
+
+        if isinstance(construct, c.FlangPredicate):
+            return self._compile_predicate(construct.pattern.match)
+
+        if isinstance(construct, c.FlangReference):
+            assert construct.target, f"Reference {construct.reference} is not linked"
+            return self.compile(construct.target)
+
+        if isinstance(construct, c.FlangComponent) and construct.prod_rule:
+            return self._compile_repetition(construct)
+
+        if isinstance(construct, (c.FlangChoice, c.FlangComponent)) and construct.is_choice:
+            return self._compile_choice(construct)
+
+        if isinstance(construct, c.FlangComponent):
+            return self._compile_component(construct)
+
+        raise NotImplementedError(f"Cannot compile {type(construct).__name__}")
+
+    @staticmethod
+    def _compile_text(value: str) -> Matcher:
+        length = len(value)
+
+        def match_text(text: str, position: int) -> FlangMatchObject | None:
+            if text.startswith(value, position):
+                return FlangMatchObject(position, position + length, text)
+            return None
+
+        return match_text
+
+    @staticmethod
+    def _compile_predicate(pattern_match) -> Matcher:
+        def match_predicate(text: str, position: int) -> FlangMatchObject | None:
+            if match := pattern_match(text, position):
+                return FlangMatchObject(position, match.end(), text)
+            return None
+
+        return match_predicate
+
+    def _compile_step(self, child: c.BaseFlangConstruct | FusedSegment) -> Step:
+        if isinstance(child, FusedSegment):
+            pattern_match, groups = child.pattern.match, tuple(child.groups.items())
+
+            def fused_step(text: str, position: int, spec: dict) -> int | None:
+                if not (match := pattern_match(text, position)):
+                    return None
+
+                for group, symbol in groups:
+                    start, end = match.span(group)
+                    spec[symbol] = FlangMatchObject(start, end, text)
+
+                return match.end()
+
+            if self.profiler is not None:
+                # fused predicates are reported together, as they are matched by one regex
+                predicates = [construct for construct in child.constructs if isinstance(construct, c.FlangPredicate)]
+                symbol = "+".join(self.location(construct) for construct in predicates or child.constructs)
+                return self.profiler.wrap_step(symbol, fused_step)
+
+            return fused_step
+
+        matcher, symbol = self.compile(child), c.spec_key(child)
+
+        if not symbol:
+
+            def anonymous_step(text: str, position: int, spec: dict) -> int | None:
+                if (match_object := matcher(text, position)) is None:
+                    return None
+
+                # captures of an unnamed component belong to the enclosing one
+                if match_object.spec:
+                    spec.update(match_object.spec)
+
+                return match_object.end
+
+            return anonymous_step
+
+        def named_step(text: str, position: int, spec: dict) -> int | None:
+            if (match_object := matcher(text, position)) is None:
+                return None
+
+            spec[symbol] = match_object
+            return match_object.end
+
+        return named_step
+
+    def _compile_component(self, construct: c.FlangComponent) -> Matcher:
+        children = construct.match_plan or [
+            child for child in construct.children if c.is_matchable(child)
+        ]
+        if self.profiler is None and len(children) == 1 and isinstance(children[0], FusedSegment):
+            return self._compile_fused_component(children[0])
+
+        steps = tuple(self._compile_step(child) for child in children)
+
+        def match_component(text: str, position: int) -> FlangMatchObject | None:
+            spec = {}
+            end = position
+
+            for step in steps:
+                if (end := step(text, end, spec)) is None:
+                    return None
+
+            return FlangMatchObject(position, end, text, spec)
+
+        return match_component
+
+    @staticmethod
+    def _compile_fused_component(segment: FusedSegment) -> Matcher:
+        """
+        Component fused into a single regex builds its match object directly,
+        without going through the steps
+        """
+        pattern_match, groups = segment.pattern.match, tuple(segment.groups.items())
+
+        def match_fused_component(text: str, position: int) -> FlangMatchObject | None:
+            if not (match := pattern_match(text, position)):
+                return None
+
+            spec = {}
+
+            for group, symbol in groups:
+                start, end = match.span(group)
+                spec[symbol] = FlangMatchObject(start, end, text)
+
+            return FlangMatchObject(position, match.end(), text, spec)
+
+        return match_fused_component
+
+    def _compile_choice(self, construct: c.FlangChoice | c.FlangComponent) -> Matcher:
+        def compile_alternatives(alternatives) -> tuple[tuple[str | None, Matcher], ...]:
+            return tuple((c.spec_key(alternative), self.compile(alternative)) for alternative in alternatives)
+
+        index = construct.choice_index
+
+        if index is None:
+            all_alternatives = compile_alternatives(c.alternatives_of(construct))
+            by_char, non_ascii, default = {}, all_alternatives, all_alternatives
+        else:
+            by_char = {char: compile_alternatives(alts) for char, alts in index.by_char.items()}
+            non_ascii, default = compile_alternatives(index.non_ascii), compile_alternatives(index.default)
+
+        def match_choice(text: str, position: int) -> FlangMatchObject | None:
+            if position < len(text):
+                char = text[position]
+                alternatives = by_char.get(char)
+
+                if alternatives is None:
+                    alternatives = non_ascii if char > "\x7f" else default
+            else:
+                alternatives = default
+
+            for symbol, matcher in alternatives:
+                if (match_object := matcher(text, position)) is None:
+                    continue
+
+                if symbol is None:
+                    return match_object
+
+                return FlangMatchObject(match_object.start, match_object.end, text, {symbol: match_object})
+
+            return None
+
+        return match_choice
+
+    def _compile_repetition(self, construct: c.FlangComponent) -> Matcher:
+        """
+        The body is compiled once and wrapped in a closure per repetition operator,
+        whether one or more iterations are required is decided here and not on every match
+        """
+        body = self._compile_choice(construct) if construct.is_choice else self._compile_component(construct)
+
+        if construct.prod_rule == "?":
+
+            def match_optional(text: str, position: int) -> FlangMatchObject | None:
+                if (match_object := body(text, position)) is not None:
+                    return match_object
+                return FlangMatchObject(position, position, text, {})
+
+            return match_optional
+
+        at_least_once = construct.prod_rule == "+"
+
+        def match_repetition(text: str, position: int) -> FlangMatchObject | None:
+            spec, end, matched = {}, position, False
+
+            while (match_object := body(text, end)) is not None:
+                matched = True
+
+                if match_object.end == end:
+                    break  # empty iteration would repeat forever
+
+                spec[str(len(spec))] = match_object
+                end = match_object.end
+
+            if at_least_once and not matched:
+                return None
+
+            return FlangMatchObject(position, end, text, spec)
+
+        return match_repetition
+
+    def _memoized(self, matcher: Matcher, key: int) -> Matcher:
+        owner = self.memo_owner
+
+        def memoized_match(text: str, position: int) -> FlangMatchObject | None:
+            memo = owner.memo
+            memo_key = (key, position)
+
+            if memo_key in memo:
+                owner.memo_hits += 1
+                return memo[memo_key]
+
+            owner.memo_misses += 1
+            memo[memo_key] = None  # left recursion fails instead of looping
+            memo[memo_key] = result = matcher(text, position)
+            return result
+
+        return memoized_match
+
+
+def compile_matcher(
+    flang_object: FlangObject, memo_owner: any = None, profiler: MatchProfiler | None = None
+) -> Matcher:
+    if not c.is_matchable(root := flang_object.root_component):
+        return lambda text, position: None
+
+    return MatcherCompiler(flang_object, memo_owner, profiler).compile(root)
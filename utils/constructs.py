@@ -1,16 +1,20 @@
 # from .dataclasses import BaseFlangConstruct
 from __future__ import annotations
-import re
-from .helpers import BUILTIN_PATTERNS, create_unique_symbol
+from .helpers import create_unique_symbol
+from .patterns import PATTERNS
 import dataclasses
 import abc
 
+# "?" matches the body at most once, "*" any number of times and "+" at least once
+PRODUCTION_RULES = ("*", "?", "+")
+
 
 @dataclasses.dataclass(slots=True)
 class BaseFlangConstruct(abc.ABC):
     children_or_value: list[BaseFlangConstruct] | str
     attributes: dict[str, str] | None
-    external_dependencies: list[str] = dataclasses.field(default_factory=list)
+    # shared empty tuple, only references to other files have dependencies
+    external_dependencies: tuple[str, ...] = ()
     parent: None | str = None
     symbol: None | str = dataclasses.field(init=False, default=None)
     path: None | str = dataclasses.field(init=False, default=None)
@@ -34,99 +38,114 @@ class BaseFlangConstruct(abc.ABC):
         return self.children_or_value
 
 class FlangComponent(BaseFlangConstruct):
+    __slots__ = ("component_type", "match_plan", "is_choice", "choice_index", "prod_rule")
     name = "component"
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.component_type = self.attributes.get("type", "matcher")
         self.symbol = self.attributes.get("name")
+        self.match_plan: list | None = None
+        # component with join="|" matches only one of its children
+        self.is_choice = self.attributes.get("join") == "|"
+        self.choice_index = None
+        self.prod_rule = self.attributes.get("prod-rule")
+        assert self.prod_rule is None or self.prod_rule in PRODUCTION_RULES, f"Unknown prod-rule {self.prod_rule}"
 
     def can_match(self) -> bool:
         return self.component_type != "definition"
 
-    def match(self, text):
-        sample = {}
-        start = 0
-
-        for matcher in self.matchers:
-            match = matcher.match(text, start)
-
-            if not match:
-                assert False, "Could not match the text!"
-
-            sample_chunk, pos = match
-
-            assert all(
-                isinstance(key, str) and isinstance(value, str)
-                for key, value in sample_chunk.items()
-            )
-
-            if not self.is_root:
-                sample_chunk = {f"{self.name}.{key}": value for key, value in sample_chunk.items()}
-
-            sample.update(sample_chunk)
-
-            start = pos
-
-        return sample, start
-
-    def generate(self, config: dict[str, str]) -> str:
-        generated_component = ""
-
-        new_config = {**config}
-
-        for key, value in config.items():
-            if key.startswith(self.name):  # todo: should be a better way to do this...
-                del new_config[key]
-                new_config[key.removeprefix(self.name)] = value
-
-        config = new_config  # cannot iterate through changing dictionary..
-
-        for matcher in self.matchers:
-            chunk, config = matcher.generate(config)
-            generated_component += chunk
-
-        return generated_component, config
-
 
 class FlangPredicate(BaseFlangConstruct):
+    __slots__ = ("_raw_pattern", "pattern")
     name = "predicate"
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self._raw_pattern = self.attributes["pattern"]
-        self.pattern = re.compile(self._raw_pattern.format(**BUILTIN_PATTERNS))
+        self.pattern = PATTERNS.compile(self._raw_pattern)
         self.symbol = self.attributes.get("name")
 
-    def generate(self, config):
-        value = config.pop(self.name)
-        return value, config
+    def __getstate__(self):
+        # only the source of the pattern is stored, so loaded predicates share compiled patterns
+        slots = {
+            name: getattr(self, name)
+            for cls in type(self).__mro__
+            for name in getattr(cls, "__slots__", ())
+            if hasattr(self, name)
+        }
+        return None, {**slots, "pattern": self.pattern.pattern}
+
+    def __setstate__(self, state):
+        _, slots = state
+
+        for name, value in slots.items():
+            object.__setattr__(self, name, value)
+
+        self.pattern = PATTERNS.intern(slots["pattern"])
 
 class FlangRawText(BaseFlangConstruct):
+    __slots__ = ()
     name = "text"
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
-    def generate(self, config):
-        return self.value, config
-
 
 class FlangRule(BaseFlangConstruct):
+    __slots__ = ()
     name = "rule"
 
 
 class FlangChoice(BaseFlangConstruct):
+    __slots__ = ("is_choice", "choice_index")
     name = "choice"
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.symbol = self.attributes.get("name") if self.attributes else None
+        self.is_choice = True
+        self.choice_index = None
+
 
 class FlangReference(BaseFlangConstruct):
+    __slots__ = ("reference", "target")
     name = "use"
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
-        refrenced_construct = self.attributes["ref"]
+        # older templates point to the construct with "name" instead of "ref"
+        self.reference = self.attributes.get("ref") or self.attributes["name"]
         self.symbol = None
-
-        if ":" in refrenced_construct:
-            self.external_dependencies.append(refrenced_construct)
+        # referenced construct, filled in by the link pass of the parser
+        self.target: BaseFlangConstruct | None = None
+
+        if ":" in self.reference:
+            self.external_dependencies = (self.reference,)
+
+
+def is_matchable(construct: BaseFlangConstruct) -> bool:
+    if isinstance(construct, FlangComponent):
+        return construct.can_match()
+    return isinstance(construct, (FlangRawText, FlangPredicate, FlangReference, FlangChoice))
+
+
+def spec_key(construct: BaseFlangConstruct) -> str | None:
+    """
+    Key of the match of the construct in the spec of its parent,
+    references are stored under the name of their target, the same as in generation
+    """
+    if isinstance(construct, FlangReference) and construct.target is not None:
+        return construct.target.symbol
+    return construct.symbol
+
+
+def alternatives_of(construct: FlangComponent | FlangChoice) -> list[BaseFlangConstruct]:
+    """
+    Whitespace between alternatives is only formatting of the template
+    """
+    return [
+        child
+        for child in construct.children
+        if is_matchable(child) and not (isinstance(child, FlangRawText) and child.value.isspace())
+    ]
@@ -1,24 +1,33 @@
 from __future__ import annotations
 import dataclasses
+import re
 from utils.constructs import BaseFlangConstruct, FlangComponent
 import collections
 
 RecursiveDict = dict[str, str | dict]  # cannot do recursive types till python 3.12
 
 
-@dataclasses.dataclass
+# line counted from 1 and column counted from 0, the same as in the ast module
+SourcePosition = collections.namedtuple("SourcePosition", ["line", "column"])
+
+
+@dataclasses.dataclass(slots=True)
 class IntermediateFlangTreeElement:
     name: str
     value: list[IntermediateFlangTreeElement] | str
     attributes: dict[str, str] | None = None
+    position: SourcePosition | None = dataclasses.field(default=None, compare=False)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class FlangObject:
     root: str = ""
     rules: list = dataclasses.field(default_factory=list)
     symbols: dict[str, BaseFlangConstruct] = dataclasses.field(default_factory=dict)
     external_dependencies: list[str] = dataclasses.field(default_factory=list)
+    external_symbols: dict[str, BaseFlangConstruct] = dataclasses.field(default_factory=dict)
+    # locations defined more than once, only the last definition is kept in symbols
+    duplicate_symbols: set[str] = dataclasses.field(default_factory=set)
 
     @property
     def root_component(self) -> FlangComponent:
@@ -28,45 +37,82 @@ class FlangObject:
 
         return root
 
-    def find_refrenced_object(self, location: str) -> BaseFlangConstruct:
+    def resolve_location(self, location: str, scope: str = "") -> str | None:
+        """
+        Location starting with a dot is relative. It is looked up in the scope of the
+        reference first and then in every enclosing scope
+        """
         if ":" in location:
-            ...
+            return location if self.external_symbols.get(location) is not None else None
+
+        if not location.startswith("."):
+            return location if location in self.symbols else None
+
+        while scope:
+            if f"{scope}{location}" in self.symbols:
+                return f"{scope}{location}"
+
+            scope, _, _ = scope.rpartition(".")
+
+        return None
+
+    def find_refrenced_object(self, location: str, scope: str = "") -> BaseFlangConstruct | None:
+        if (resolved := self.resolve_location(location, scope)) is None:
+            return None
+
+        if ":" in resolved:
+            return self.external_symbols[resolved]
+
+        return self.symbols[resolved]
 
 
 Postition = collections.namedtuple("Postition", ["start", "end"])
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class FlangMatchObject:
-    position: Postition
-    spec_or_matched: dict[str, FlangMatchObject] | str
+    """
+    Match keeps only offsets into the matched text, which is shared by all of the
+    match objects. Substrings are created only when they are asked for
+    """
 
-    def to_dict(self) -> RecursiveDict:
-        if isinstance(self.spec_or_matched, str):
-            return self.spec_or_matched
+    start: int
+    end: int
+    source: str = dataclasses.field(repr=False)
+    spec: dict[str, FlangMatchObject] | None = None
 
-        assert False, "TODO: TUTAJ SKONCZYŁESSSSS AAA"
-        return {
-            key: value.to_dict() for key, value in self.spec_or_matched.items()
-        }
-        
-        return {
-            key: value.to_dict() for key, value in self.spec_or_matched.items()
-        }
+    @property
+    def position(self) -> Postition:
+        return Postition(self.start, self.end)
 
+    @property
+    def matched(self) -> str:
+        return self.source[self.start : self.end]
 
-    def to_flat_dict(self) -> dict[str, str]:
-        regular_dict = self.to_dict()
+    @property
+    def spec_or_matched(self) -> dict[str, FlangMatchObject] | str:
+        return self.matched if self.spec is None else self.spec
+
+    def __getitem__(self, key: str) -> FlangMatchObject:
+        assert self.spec is not None, "Cannot access children of matched text"
+        return self.spec[key]
+
+    def to_dict(self) -> RecursiveDict | str:
+        if self.spec is None:
+            return self.matched
+
+        return {key: value.to_dict() for key, value in self.spec.items()}
 
+    def to_flat_dict(self) -> dict[str, str]:
         flat_dict = {}
 
-        for key, value in regular_dict.items():
-            if isinstance(value, str):
-                flat_dict[key] = value
-            else:
-                value = self.to_flat_dict(value)
-                for internal_key, internal_value in value.items():
-                    flat_dict[f"{key}.{internal_key}"] = internal_value
+        for key, value in (self.spec or {}).items():
+            if value.spec is None:
+                flat_dict[key] = value.matched
+                continue
+
+            for internal_key, internal_value in value.to_flat_dict().items():
+                flat_dict[f"{key}.{internal_key}"] = internal_value
 
         return flat_dict
 
@@ -74,3 +120,55 @@ class FlangMatchObject:
     def from_flat(cls) -> dict[str, str]:
         ...
 
+
+@dataclasses.dataclass
+class FusedSegment:
+    """
+    Run of raw text and predicates compiled into a single regular expression.
+    Each predicate is captured in its own named group
+    """
+
+    pattern: re.Pattern
+    constructs: list[BaseFlangConstruct]
+    groups: dict[str, str] = dataclasses.field(default_factory=dict)
+
+    def to_spec(self, match: re.Match) -> dict[str, FlangMatchObject]:
+        return {
+            symbol: FlangMatchObject(match.start(group), match.end(group), match.string)
+            for group, symbol in self.groups.items()
+        }
+
+
+
+@dataclasses.dataclass
+class ChoiceIndex:
+    """
+    Alternatives of a choice grouped by the first character they can start with.
+    Every group keeps the order of alternatives from the template
+    """
+
+    by_char: dict[str, tuple[BaseFlangConstruct, ...]]
+    non_ascii: tuple[BaseFlangConstruct, ...]
+    default: tuple[BaseFlangConstruct, ...]
+
+    def candidates(self, text: str, position: int) -> tuple[BaseFlangConstruct, ...]:
+        if position >= len(text):
+            return self.default
+
+        char = text[position]
+
+        if (alternatives := self.by_char.get(char)) is not None:
+            return alternatives
+
+        return self.non_ascii if char > "\x7f" else self.default
+
+
+@dataclasses.dataclass
+class FlangBatchResult:
+    index: int
+    result: any = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
@@ -0,0 +1,290 @@
+from __future__ import annotations
+import dataclasses
+import operator
+
+from utils.dataclasses import FlangObject
+from utils.sre import sre_parse, sre_constants
+import utils.constructs as c
+
+Spec = dict[str, str]
+
+
+class GenerationError(ValueError):
+    ...
+
+
+def literal_pattern_value(construct: c.FlangPredicate) -> str | None:
+    """
+    Predicates like "let" or "\\(\\)" can only ever match one text
+    """
+    try:
+        parsed = sre_parse.parse(construct.pattern.pattern, construct.pattern.flags)
+    except Exception:
+        return None
+
+    if not all(opcode is sre_constants.LITERAL for opcode, _ in parsed):
+        return None
+
+    return "".join(chr(argument) for _, argument in parsed)
+
+
+@dataclasses.dataclass
+class ChoicePlan:
+    """
+    The first alternative using any key of the spec and accepting it is generated,
+    otherwise the first alternative without keys
+    """
+
+    alternatives: list[GenerationPlan]
+
+    @property
+    def keys(self) -> frozenset[str]:
+        return frozenset().union(*(plan.keys for plan in self.alternatives))
+
+    @property
+    def prefixes(self) -> frozenset[str]:
+        return frozenset().union(*(plan.prefixes for plan in self.alternatives))
+
+    def accepts(self, spec: Spec) -> bool:
+        return self._pick(spec) is not None
+
+    def _pick(self, spec: Spec) -> GenerationPlan | None:
+        fallback = None
+
+        for plan in self.alternatives:
+            if plan.is_keyless:
+                fallback = fallback or plan
+            elif plan.uses_any(spec) and plan.accepts(spec):
+                return plan
+
+        return fallback
+
+    def generate(self, spec: Spec) -> str:
+        if (plan := self._pick(spec)) is None:
+            raise GenerationError("Spec does not have keys for any of the alternatives")
+
+        return plan.generate(spec)
+
+
+@dataclasses.dataclass
+class OptionalPlan:
+    """
+    Body of a "?" component is generated only when the spec has any of its keys,
+    body without keys is always generated
+    """
+
+    plan: GenerationPlan
+
+    @property
+    def keys(self) -> frozenset[str]:
+        return self.plan.keys
+
+    @property
+    def prefixes(self) -> frozenset[str]:
+        return self.plan.prefixes
+
+    def accepts(self, spec: Spec) -> bool:
+        return True
+
+    def generate(self, spec: Spec) -> str:
+        if not self.plan.is_keyless and not self.plan.uses_any(spec):
+            return ""
+
+        return self.plan.generate(spec)
+
+
+@dataclasses.dataclass
+class RepetitionPlan:
+    """
+    Iterations of "*" and "+" components are read from keys like "prefix.0.key",
+    the same as the flat dictionary produced by matching
+    """
+
+    prefix: str
+    plan: GenerationPlan
+    at_least_once: bool = False
+
+    @property
+    def keys(self) -> frozenset[str]:
+        return frozenset()
+
+    @property
+    def prefixes(self) -> frozenset[str]:
+        return frozenset() if self.plan.is_keyless else frozenset([self.prefix])
+
+    def accepts(self, spec: Spec) -> bool:
+        return not self.at_least_once or self.plan.is_keyless or any(key.startswith(self.prefix) for key in spec)
+
+    def generate(self, spec: Spec) -> str:
+        iterations: dict[int, Spec] = {}
+
+        for key, value in spec.items():
+            if not key.startswith(self.prefix):
+                continue
+
+            index, _, relative_key = key[len(self.prefix) :].partition(".")
+
+            if index.isdigit():
+                iterations.setdefault(int(index), {})[relative_key] = value
+
+        if self.at_least_once and not iterations:
+            if not self.plan.is_keyless:
+                raise GenerationError(f"Spec does not have any iteration of {self.prefix.rstrip('.')}")
+
+            iterations[0] = {}  # iterations of a body without keys leave nothing in the spec
+
+        return "".join(self.plan.generate(iterations[index]) for index in sorted(iterations))
+
+
+@dataclasses.dataclass
+class GenerationPlan:
+    """
+    Precomputed way of generating text of a component.
+    Text is rendered from a format template with positional fields, every field
+    is a resolved key path of the spec or a choice decided at generation time.
+
+    Keys are the key paths the plan can read, nested fields included, and prefixes
+    start the keys of repeated components
+    """
+
+    template: str
+    fields: tuple[str | ChoicePlan | OptionalPlan | RepetitionPlan, ...]
+    keys: frozenset[str] = dataclasses.field(init=False, repr=False, compare=False)
+    prefixes: frozenset[str] = dataclasses.field(init=False, repr=False, compare=False)
+    _getter: operator.itemgetter | None = dataclasses.field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        static = all(isinstance(field, str) for field in self.fields)
+        # itemgetter of a single key does not return a tuple
+        self._getter = operator.itemgetter(*self.fields) if static and len(self.fields) > 1 else None
+        nested = [field for field in self.fields if not isinstance(field, str)]
+        self.keys = frozenset(field for field in self.fields if isinstance(field, str)).union(
+            *(field.keys for field in nested)
+        )
+        self.prefixes = frozenset().union(*(field.prefixes for field in nested))
+
+    @property
+    def is_keyless(self) -> bool:
+        return not self.keys and not self.prefixes
+
+    def uses_any(self, spec: Spec) -> bool:
+        prefixes = tuple(self.prefixes)
+        return any(key in self.keys or key.startswith(prefixes) for key in spec)
+
+    def accepts(self, spec: Spec) -> bool:
+        """
+        Spec has every key the plan requires
+        """
+        return all(field in spec if isinstance(field, str) else field.accepts(spec) for field in self.fields)
+
+    def generate(self, spec: Spec) -> str:
+        try:
+            if self._getter is not None:
+                return self.template.format(*self._getter(spec))
+
+            return self.template.format(
+                *[
+                    spec[field] if isinstance(field, str) else field.generate(spec)
+                    for field in self.fields
+                ]
+            )
+        except KeyError as error:
+            raise GenerationError(f"Missing value for {error.args[0]} in the spec") from error
+
+
+class _PlanBuilder:
+    def __init__(self, flang_object: FlangObject | None) -> None:
+        self.flang_object = flang_object
+        self.template_parts: list[str] = []
+        self.fields: list[str | ChoicePlan | OptionalPlan | RepetitionPlan] = []
+        self.visiting: set[int] = set()
+
+    def add_construct(self, construct: c.BaseFlangConstruct, prefix: str):
+        if isinstance(construct, c.FlangRawText):
+            self.template_parts.append(construct.value.replace("{", "{{").replace("}", "}}"))
+
+        elif isinstance(construct, c.FlangPredicate):
+            if construct.symbol:
+                self.add_field(f"{prefix}{construct.symbol}")
+            elif (literal := literal_pattern_value(construct)) is not None:
+                self.template_parts.append(literal.replace("{", "{{").replace("}", "}}"))
+            else:
+                raise GenerationError(f"Cannot generate unnamed predicate {construct.attributes}")
+
+        elif isinstance(construct, c.FlangReference):
+            if (target := construct.target) is None:
+                raise GenerationError(f"Reference {construct.reference} is not linked")
+            if id(target) in self.visiting:
+                raise GenerationError(f"Recursive reference {construct.reference} cannot be generated")
+
+            self.add_named(target, prefix)
+
+        elif isinstance(construct, (c.FlangComponent, c.FlangChoice)):
+            self.add_named(construct, prefix)
+
+    def add_named(
+        self, construct: c.FlangComponent | c.FlangChoice, prefix: str, include_symbol: bool = True
+    ):
+        if construct.symbol and include_symbol:
+            prefix = f"{prefix}{construct.symbol}."
+        self.visiting.add(id(construct))
+
+        if prod_rule := getattr(construct, "prod_rule", None):
+            body = _PlanBuilder(self.flang_object)
+            body.visiting = self.visiting
+
+            if prod_rule == "?":
+                body.add_body(construct, prefix)
+                self.add_field(OptionalPlan(body.build()))
+            else:
+                # keys of the body are relative to the iteration
+                body.add_body(construct, "")
+                self.add_field(RepetitionPlan(prefix, body.build(), at_least_once=prod_rule == "+"))
+        else:
+            self.add_body(construct, prefix)
+
+        self.visiting.discard(id(construct))
+
+    def add_body(self, construct: c.FlangComponent | c.FlangChoice, prefix: str):
+        if construct.is_choice:
+            self.add_field(
+                ChoicePlan(
+                    [
+                        build_plan(alternative, self.flang_object, prefix, self.visiting)
+                        for alternative in c.alternatives_of(construct)
+                    ]
+                )
+            )
+        else:
+            for child in construct.children:
+                if c.is_matchable(child):
+                    self.add_construct(child, prefix)
+
+    def add_field(self, field: str | ChoicePlan | OptionalPlan | RepetitionPlan):
+        self.template_parts.append(f"{{{len(self.fields)}}}")
+        self.fields.append(field)
+
+    def build(self) -> GenerationPlan:
+        return GenerationPlan(template="".join(self.template_parts), fields=tuple(self.fields))
+
+
+def build_plan(
+    construct: c.BaseFlangConstruct,
+    flang_object: FlangObject | None = None,
+    prefix: str = "",
+    visiting: set[int] | None = None,
+) -> GenerationPlan:
+    builder = _PlanBuilder(flang_object)
+    builder.visiting = visiting if visiting is not None else set()
+    builder.add_construct(construct, prefix)
+    return builder.build()
+
+
+def compile_generation_plan(flang_object: FlangObject) -> GenerationPlan:
+    """
+    Keys of the spec are paths relative to the root component,
+    the same as keys of the flat dictionary produced by matching
+    """
+    builder = _PlanBuilder(flang_object)
+    builder.add_named(flang_object.root_component, "", include_symbol=False)
+    return builder.build()
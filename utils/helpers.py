@@ -1,11 +1,9 @@
+import collections
 import itertools
 import random
+import sys
 
-BUILTIN_PATTERNS = {
-    "vname": r"[A-Za-z]\w+",
-    "number": r"-?(([1-9]+\d*)|0)(\.\d*)?",
-    "string": r"((?:\\)\"[^\"]*(?:\\)\")|((?:\\)'[^\']*(?:\\)')",
-}
+from .patterns import BUILTIN_PATTERNS
 
 global_anonymous_name_counter = 0
 
@@ -15,6 +13,42 @@ def interlace(*iterables):
             if item is not None:
                 yield item
 
+class AttributeInterner:
+    """
+    Keeps a single dictionary for every distinct set of attributes, with interned
+    keys and values. Attributes of constructs are never modified after parsing,
+    so constructs with equal attributes share one dictionary.
+    Only max_size least recently used sets are kept, so reloaded templates do not
+    grow the table forever. Constructs keep their dictionaries when a set is dropped
+    """
+
+    def __init__(self, max_size: int = 4096) -> None:
+        self.max_size = max_size
+        self.table: collections.OrderedDict[tuple[tuple[str, str], ...], dict[str, str]] = collections.OrderedDict()
+
+    def intern(self, attributes: dict[str, str] | None) -> dict[str, str] | None:
+        if attributes is None:
+            return None
+
+        key = tuple(attributes.items())
+
+        if (shared := self.table.get(key)) is not None:
+            self.table.move_to_end(key)
+            return shared
+
+        if len(self.table) >= self.max_size:
+            self.table.popitem(last=False)
+
+        shared = self.table[key] = {sys.intern(name): sys.intern(value) for name, value in key}
+        return shared
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+
+ATTRIBUTES = AttributeInterner()
+
+
 def create_unique_symbol(obj) -> str:
     global global_anonymous_name_counter
     symbol = f"{type(obj).__name__}@{global_anonymous_name_counter}"
@@ -0,0 +1,168 @@
+from __future__ import annotations
+import xml.parsers.expat
+
+from utils.abstracts import TextToIntermediateTreeParser, SingleFileParser
+from utils.cache import FlangObjectCache
+from utils.dataclasses import FlangObject
+from utils.patterns import PATTERNS
+
+LibraryOffsets = tuple[int, int, bool]  # start, end (or end tag start), self closing
+
+
+def is_library_file(filepath: str, read_size: int = 1024) -> bool:
+    """
+    Libraries wrap their components in a root element other than a component.
+    Only the beginning of the file is read, broken files are not libraries
+    """
+    parser = xml.parsers.expat.ParserCreate()
+    root_tags: list[str] = []
+
+    def start_element(tag: str, _: dict[str, str]):
+        root_tags.append(tag)
+
+    parser.StartElementHandler = start_element
+
+    try:
+        with open(filepath, "rb") as f:
+            while not root_tags and (chunk := f.read(read_size)):
+                parser.Parse(chunk, False)
+    except (OSError, xml.parsers.expat.ExpatError):
+        return False
+
+    return bool(root_tags) and root_tags[0] != "component"
+
+
+class FlangLibrary:
+    """
+    Template file holding many top level components under a single wrapper element.
+
+    Opening the library only indexes byte offsets of the top level components in one
+    streaming pass, the components themselves are parsed and built on first access.
+    Components built so far are also merged into a single flang object, which stands
+    for the library among the loaded files
+    """
+
+    END_TAG_READ_SIZE = 64
+
+    def __init__(
+        self,
+        filepath: str,
+        intermediate_parser: TextToIntermediateTreeParser,
+        single_file_parser: SingleFileParser,
+        cache: FlangObjectCache | None = None,
+    ) -> None:
+        self.filepath = filepath
+        self.intermediate_parser = intermediate_parser
+        self.single_file_parser = single_file_parser
+        self.cache = cache
+        self.offsets: dict[str, LibraryOffsets] = {}
+        self.components: dict[str, FlangObject] = {}
+        self.loaded = FlangObject()
+        self._index()
+
+    def _index(self) -> None:
+        parser = xml.parsers.expat.ParserCreate()
+        depth = 0
+        current: dict = {}
+
+        def start_element(tag: str, attributes: dict[str, str]):
+            nonlocal depth
+            depth += 1
+            current["events"] = current.get("events", 0) + 1
+
+            if depth == 2 and tag == "component":
+                current.update(
+                    name=attributes.get("name"),
+                    start=parser.CurrentByteIndex,
+                    events=0,
+                )
+
+        def end_element(tag: str):
+            nonlocal depth
+            depth -= 1
+
+            if depth == 1 and tag == "component":
+                assert current["name"], "Top level library components must be named"
+                assert current["name"] not in self.offsets, f"Repeated component {current['name']}"
+                self.offsets[current["name"]] = (
+                    current["start"],
+                    parser.CurrentByteIndex,
+                    current["events"] == 0,
+                )
+
+        def character_data(_: str):
+            current["events"] = current.get("events", 0) + 1
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+
+        with open(self.filepath, "rb") as f:
+            parser.ParseFile(f)
+
+    def _read_component(self, name: str) -> str:
+        start, end, may_be_self_closing = self.offsets[name]
+
+        with open(self.filepath, "rb") as f:
+            f.seek(start)
+            fragment = f.read(end - start)
+
+            if may_be_self_closing and fragment.endswith(b"/>"):
+                return fragment.decode()
+
+            # offset points to the beginning of the end tag
+            while (end_tag_end := fragment.find(b">", end - start)) == -1:
+                chunk = f.read(self.END_TAG_READ_SIZE)
+                assert chunk, f"Unterminated component {name}"
+                fragment += chunk
+
+        return fragment[: end_tag_end + 1].decode()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def names(self) -> list[str]:
+        return list(self.offsets)
+
+    def get(self, name: str) -> FlangObject:
+        if name not in self.components:
+            assert name in self.offsets, f"Cannot find component {name} in {self.filepath}"
+            self.components[name] = flang_object = self._build(self._read_component(name))
+            self._merge(flang_object)
+
+        return self.components[name]
+
+    def discard(self, name: str) -> FlangObject:
+        """
+        Forgets the built component, it is built again on the next access
+        """
+        flang_object = self.components.pop(name)
+        self.loaded.symbols.clear()
+        self.loaded.external_dependencies.clear()
+        self.loaded.duplicate_symbols.clear()
+
+        for component in self.components.values():
+            self._merge(component)
+
+        return flang_object
+
+    def _build(self, text: str) -> FlangObject:
+        cache_key = self.cache.key(text, str(False), PATTERNS.fingerprint) if self.cache else None
+
+        if cache_key and (flang_object := self.cache.load(cache_key)) is not None:
+            return flang_object
+
+        flang_object = self.single_file_parser.parse(self.intermediate_parser.parse(text))
+
+        if cache_key:
+            self.cache.store(cache_key, flang_object)
+
+        return flang_object
+
+    def _merge(self, flang_object: FlangObject) -> None:
+        self.loaded.symbols.update(flang_object.symbols)
+        self.loaded.external_dependencies.extend(flang_object.external_dependencies)
+        self.loaded.duplicate_symbols.update(flang_object.duplicate_symbols)
@@ -0,0 +1,37 @@
+from __future__ import annotations
+from typing import Collection
+
+from utils.dataclasses import FlangObject
+import utils.constructs as c
+
+
+class FlangLinkError(ValueError):
+    def __init__(self, problems: list[str]) -> None:
+        super().__init__("Cannot link references:\n" + "\n".join(problems))
+        self.problems = problems
+
+
+def link_references(flang_object: FlangObject, ambiguous: Collection[str] = ()) -> None:
+    """
+    Resolves every reference of the flang object once and stores the referenced
+    construct on it, so matching never looks symbols up by name.
+    Instead of stopping on the first broken reference, all unresolved and ambiguous
+    references are reported together
+    """
+    problems = []
+
+    for location, construct in flang_object.symbols.items():
+        if not isinstance(construct, c.FlangReference):
+            continue
+
+        resolved = flang_object.resolve_location(construct.reference, construct.parent)
+
+        if resolved is None:
+            problems.append(f"{location}: cannot find object {construct.reference}")
+        elif resolved in flang_object.duplicate_symbols or resolved in ambiguous:
+            problems.append(f"{location}: {construct.reference} points to {resolved} defined more than once")
+        else:
+            construct.target = flang_object.find_refrenced_object(resolved)
+
+    if problems:
+        raise FlangLinkError(problems)
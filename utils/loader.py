@@ -0,0 +1,86 @@
+from __future__ import annotations
+import concurrent.futures
+
+from utils.abstracts import TextToIntermediateTreeParser, SingleFileParser
+from utils.dataclasses import FlangObject
+
+
+class FlangDependencyCycleError(ValueError):
+    def __init__(self, cycle: list[str]) -> None:
+        super().__init__("Templates import each other: " + " -> ".join(cycle))
+        self.cycle = cycle
+
+
+def dependency_files(flang_object: FlangObject) -> list[str]:
+    return list(dict.fromkeys(dependency.split(":")[0] for dependency in flang_object.external_dependencies))
+
+
+def parse_template(
+    text: str, intermediate_parser: TextToIntermediateTreeParser, single_file_parser: SingleFileParser
+) -> FlangObject:
+    intermediate_tree = intermediate_parser.parse(text)
+    assert intermediate_tree.name == "component"  # sanity check
+
+    return single_file_parser.parse(intermediate_tree)
+
+
+def parse_templates(
+    texts: dict[str, str],
+    intermediate_parsers: dict[str, TextToIntermediateTreeParser],
+    single_file_parsers: dict[str, SingleFileParser],
+    workers: int | None = None,
+    processes: bool = False,
+) -> dict[str, FlangObject]:
+    """
+    Parses independent files one after another, or in a pool of processes
+    when processes is set. Parsing holds the GIL, so threads would only add
+    overhead, and processes pay off only when there are many big templates to parse
+    """
+    if not processes or len(texts) <= 1 or workers == 1:
+        return {
+            path: parse_template(text, intermediate_parsers[path], single_file_parsers[path])
+            for path, text in texts.items()
+        }
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            path: executor.submit(parse_template, text, intermediate_parsers[path], single_file_parsers[path])
+            for path, text in texts.items()
+        }
+        return {path: future.result() for path, future in futures.items()}
+
+
+def find_cycle(graph: dict[str, list[str]]) -> list[str] | None:
+    """
+    Returns files forming a cycle in the import graph, the first file is repeated
+    at the end. A file using its own symbols is not a cycle
+    """
+    visited: set[str] = set()
+
+    for start in graph:
+        if start in visited:
+            continue
+
+        path, on_path = [start], {start}
+        stack = [iter(graph[start])]
+        visited.add(start)
+
+        while stack:
+            for dependency in stack[-1]:
+                if dependency == path[-1]:
+                    continue
+                if dependency in on_path:
+                    return path[path.index(dependency) :] + [dependency]
+                if dependency in visited or dependency not in graph:
+                    continue
+
+                visited.add(dependency)
+                path.append(dependency)
+                on_path.add(dependency)
+                stack.append(iter(graph[dependency]))
+                break
+            else:
+                stack.pop()
+                on_path.discard(path.pop())
+
+    return None
@@ -0,0 +1,302 @@
+from __future__ import annotations
+import re
+
+from utils.dataclasses import FlangObject, FusedSegment, ChoiceIndex
+from utils.sre import sre_parse, sre_constants
+from utils.patterns import PATTERNS
+import utils.constructs as c
+
+FUSABLE_CONSTRUCTS = (c.FlangRawText, c.FlangPredicate)
+
+# patterns depending on group numbers or names cannot be embedded into a bigger regex
+GROUP_DEPENDENT_SYNTAX = re.compile(r"\\[1-9]|\\g<|\(\?P[<=]|\(\?\(")
+
+
+def can_fuse(construct: c.BaseFlangConstruct) -> bool:
+    if isinstance(construct, c.FlangPredicate):
+        return not GROUP_DEPENDENT_SYNTAX.search(construct.pattern.pattern)
+
+    return isinstance(construct, FUSABLE_CONSTRUCTS)
+
+
+def fuse_constructs(constructs: list[c.BaseFlangConstruct]) -> FusedSegment | None:
+    """
+    Predicates are matched separately by the tree walk, so they never give back
+    characters to the following constructs. To keep the same semantics inside a single
+    regex, each predicate is wrapped into an atomic group emulated with lookahead
+    """
+    regex_parts = []
+    groups = {}
+
+    for idx, construct in enumerate(constructs):
+        if isinstance(construct, c.FlangRawText):
+            regex_parts.append(re.escape(construct.value))
+            continue
+
+        group = f"_p{idx}"
+        regex_parts.append(f"(?=(?P<{group}>{construct.pattern.pattern}))(?P={group})")
+
+        if construct.symbol:
+            groups[group] = construct.symbol
+
+    try:
+        pattern = PATTERNS.intern("".join(regex_parts))
+    except re.error:
+        return None
+
+    return FusedSegment(pattern=pattern, constructs=constructs, groups=groups)
+
+
+def build_match_plan(
+    component: c.FlangComponent,
+) -> list[c.BaseFlangConstruct | FusedSegment]:
+    plan = []
+    run = []
+
+    def flush_run():
+        if len(run) > 1 and (segment := fuse_constructs(run[:])):
+            plan.append(segment)
+        else:
+            plan.extend(run)
+        run.clear()
+
+    for child in component.children:
+        if not c.is_matchable(child):
+            # definitions and rules never take part in matching
+            continue
+
+        if can_fuse(child):
+            run.append(child)
+            continue
+
+        flush_run()
+        plan.append(child)
+
+    flush_run()
+    return plan
+
+
+def fuse_components(flang_object: FlangObject) -> None:
+    for construct in flang_object.symbols.values():
+        if isinstance(construct, c.FlangComponent) and not construct.is_choice:
+            construct.match_plan = build_match_plan(construct)
+
+
+# First characters of constructs.
+# FirstSet is a pair of possible ASCII first characters and a flag telling if the
+# construct can start with a non ASCII character. None means that the construct can
+# start with anything, because it can match an empty string or it is too complex to analyze
+
+FirstSet = tuple[frozenset[str], bool] | None
+
+ASCII_CHARS = [chr(code) for code in range(128)]
+
+CATEGORY_PATTERNS = {
+    sre_constants.CATEGORY_DIGIT: r"\d",
+    sre_constants.CATEGORY_NOT_DIGIT: r"\D",
+    sre_constants.CATEGORY_SPACE: r"\s",
+    sre_constants.CATEGORY_NOT_SPACE: r"\S",
+    sre_constants.CATEGORY_WORD: r"\w",
+    sre_constants.CATEGORY_NOT_WORD: r"\W",
+}
+
+CATEGORY_ASCII_CHARS = {
+    category: frozenset(char for char in ASCII_CHARS if re.match(pattern, char))
+    for category, pattern in CATEGORY_PATTERNS.items()
+}
+
+REPEAT_OPCODES = {
+    getattr(sre_constants, name)
+    for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(sre_constants, name)
+}
+
+# (ascii chars, non ascii, nullable)
+_PatternFirst = tuple[frozenset[str], bool, bool] | None
+
+
+def _sequence_first(items) -> _PatternFirst:
+    chars, non_ascii = frozenset(), False
+
+    for opcode, argument in items:
+        item = _item_first(opcode, argument)
+
+        if item is None:
+            return None
+
+        item_chars, item_non_ascii, nullable = item
+        chars, non_ascii = chars | item_chars, non_ascii or item_non_ascii
+
+        if not nullable:
+            return chars, non_ascii, False
+
+    return chars, non_ascii, True
+
+
+def _set_first(items) -> _PatternFirst:
+    chars, non_ascii = set(), False
+
+    for opcode, argument in items:
+        if opcode is sre_constants.LITERAL:
+            if argument < 128:
+                chars.add(chr(argument))
+            else:
+                non_ascii = True
+        elif opcode is sre_constants.RANGE:
+            low, high = argument
+            chars.update(ASCII_CHARS[low : min(high, 127) + 1])
+            non_ascii = non_ascii or high > 127
+        elif opcode is sre_constants.CATEGORY and argument in CATEGORY_ASCII_CHARS:
+            chars |= CATEGORY_ASCII_CHARS[argument]
+            non_ascii = True
+        else:
+            return None
+
+    return frozenset(chars), non_ascii, False
+
+
+def _item_first(opcode, argument) -> _PatternFirst:
+    if opcode is sre_constants.LITERAL:
+        return (frozenset(chr(argument)), False, False) if argument < 128 else (frozenset(), True, False)
+
+    if opcode is sre_constants.IN:
+        return _set_first(argument)
+
+    if opcode is sre_constants.SUBPATTERN:
+        _, add_flags, del_flags, subpattern = argument
+        return None if add_flags or del_flags else _sequence_first(subpattern)
+
+    if opcode is sre_constants.BRANCH:
+        chars, non_ascii, nullable = frozenset(), False, False
+
+        for branch in argument[1]:
+            if (branch_first := _sequence_first(branch)) is None:
+                return None
+
+            chars, non_ascii = chars | branch_first[0], non_ascii or branch_first[1]
+            nullable = nullable or branch_first[2]
+
+        return chars, non_ascii, nullable
+
+    if opcode in REPEAT_OPCODES:
+        minimum, _, subpattern = argument
+
+        if (repeated_first := _sequence_first(subpattern)) is None:
+            return None
+
+        chars, non_ascii, nullable = repeated_first
+        return chars, non_ascii, nullable or minimum == 0
+
+    if opcode is getattr(sre_constants, "ATOMIC_GROUP", None):
+        return _sequence_first(argument)
+
+    if opcode is sre_constants.AT:
+        # anchors do not consume characters
+        return frozenset(), False, True
+
+    return None
+
+
+def pattern_first_set(pattern: re.Pattern) -> FirstSet:
+    if pattern.flags & re.IGNORECASE:
+        return None
+
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except (re.error, RecursionError):
+        return None
+
+    state = getattr(parsed, "state", None)
+    if state is not None and state.flags & re.IGNORECASE:
+        return None
+
+    first = _sequence_first(parsed)
+
+    if first is None or first[2]:
+        return None
+
+    return first[0], first[1]
+
+
+def _union_first_sets(first_sets: list[FirstSet]) -> FirstSet:
+    if any(first_set is None for first_set in first_sets):
+        return None
+
+    return (
+        frozenset().union(*(chars for chars, _ in first_sets)),
+        any(non_ascii for _, non_ascii in first_sets),
+    )
+
+
+def construct_first_set(
+    flang_object: FlangObject,
+    construct: c.BaseFlangConstruct,
+    visiting: set[int] | None = None,
+) -> FirstSet:
+    visiting = visiting if visiting is not None else set()
+
+    if id(construct) in visiting:
+        return None  # recursive reference, cannot say anything about it
+
+    visiting.add(id(construct))
+
+    try:
+        if isinstance(construct, c.FlangRawText):
+            if not construct.value:
+                return None
+            first_char = construct.value[0]
+            return (frozenset(first_char), False) if first_char < "\x80" else (frozenset(), True)
+
+        if isinstance(construct, c.FlangPredicate):
+            return pattern_first_set(construct.pattern)
+
+        if isinstance(construct, c.FlangReference):
+            return construct.target and construct_first_set(flang_object, construct.target, visiting)
+
+        if isinstance(construct, c.FlangComponent) and construct.prod_rule in ("*", "?"):
+            return None  # can match an empty string
+
+        if isinstance(construct, (c.FlangChoice, c.FlangComponent)) and construct.is_choice:
+            return _union_first_sets(
+                [
+                    construct_first_set(flang_object, alternative, visiting)
+                    for alternative in c.alternatives_of(construct)
+                ]
+            )
+
+        if isinstance(construct, c.FlangComponent):
+            # strict sequence, so the first matchable child decides
+            for child in construct.children:
+                if c.is_matchable(child):
+                    return construct_first_set(flang_object, child, visiting)
+
+        return None
+    finally:
+        visiting.discard(id(construct))
+
+
+def build_choice_index(
+    flang_object: FlangObject, choice: c.FlangChoice | c.FlangComponent
+) -> ChoiceIndex:
+    alternatives = c.alternatives_of(choice)
+    first_sets = [construct_first_set(flang_object, alternative) for alternative in alternatives]
+    indexed_chars = frozenset().union(*(first_set[0] for first_set in first_sets if first_set))
+
+    def select(condition) -> tuple[c.BaseFlangConstruct, ...]:
+        return tuple(
+            alternative
+            for alternative, first_set in zip(alternatives, first_sets)
+            if first_set is None or condition(first_set)
+        )
+
+    return ChoiceIndex(
+        by_char={char: select(lambda first_set: char in first_set[0]) for char in indexed_chars},
+        non_ascii=select(lambda first_set: first_set[1]),
+        default=select(lambda _: False),
+    )
+
+
+def index_choices(flang_object: FlangObject) -> None:
+    for construct in flang_object.symbols.values():
+        if isinstance(construct, (c.FlangChoice, c.FlangComponent)) and construct.is_choice:
+            construct.choice_index = build_choice_index(flang_object, construct)
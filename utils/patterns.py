@@ -0,0 +1,90 @@
+from __future__ import annotations
+import collections
+import json
+import re
+
+BUILTIN_PATTERNS = {
+    "vname": r"[A-Za-z]\w+",
+    "number": r"-?(([1-9]+\d*)|0)(\.\d*)?",
+    "string": r"((?:\\)\"[^\"]*(?:\\)\")|((?:\\)'[^\']*(?:\\)')",
+}
+
+
+class UnknownPatternError(ValueError):
+    def __init__(self, name: str) -> None:
+        super().__init__(f"Unknown pattern {{{name}}}")
+        self.name = name
+
+
+class PatternRegistry:
+    """
+    Named patterns, which predicates use as {name}, and compiled patterns of the
+    predicates. Every distinct pattern is expanded and compiled once per process,
+    all predicates with the same pattern share one compiled object.
+    Only max_size least recently used patterns are kept, the same as attributes of the constructs
+    """
+
+    def __init__(self, named: dict[str, str] | None = None, max_size: int = 4096) -> None:
+        self.named: dict[str, str] = {**BUILTIN_PATTERNS, **(named or {})}
+        self.max_size = max_size
+        self._expanded: collections.OrderedDict[str, re.Pattern] = collections.OrderedDict()
+        self._interned: collections.OrderedDict[tuple[str, int], re.Pattern] = collections.OrderedDict()
+
+    def register(self, name: str, pattern: str) -> None:
+        if self.named.get(name) != pattern:
+            self.named[name] = pattern
+            self._expanded.clear()  # could be expanded with the old definition
+
+    def unregister(self, name: str) -> None:
+        """
+        Builtin patterns get their default definition back
+        """
+        if name in BUILTIN_PATTERNS:
+            self.register(name, BUILTIN_PATTERNS[name])
+        elif self.named.pop(name, None) is not None:
+            self._expanded.clear()
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Part of the keys of cached templates, changes with any of the named patterns
+        """
+        return json.dumps(self.named, sort_keys=True)
+
+    def compile(self, raw_pattern: str) -> re.Pattern:
+        if (pattern := self._expanded.get(raw_pattern)) is not None:
+            self._expanded.move_to_end(raw_pattern)
+            return pattern
+
+        try:
+            expanded = raw_pattern.format_map(self.named)
+        except KeyError as error:
+            raise UnknownPatternError(error.args[0]) from None
+
+        if len(self._expanded) >= self.max_size:
+            self._expanded.popitem(last=False)
+
+        pattern = self._expanded[raw_pattern] = self.intern(expanded)
+        return pattern
+
+    def intern(self, pattern: str, flags: int = 0) -> re.Pattern:
+        """
+        Compiles already expanded regular expression
+        """
+        key = (pattern, flags)
+
+        if (compiled := self._interned.get(key)) is not None:
+            self._interned.move_to_end(key)
+            return compiled
+
+        if len(self._interned) >= self.max_size:
+            self._interned.popitem(last=False)
+
+        compiled = self._interned[key] = re.compile(pattern, flags)
+        return compiled
+
+    def __len__(self) -> int:
+        return len(self._interned)
+
+
+PATTERNS = PatternRegistry()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import dataclasses
+import json
+import time
+
+from utils.dataclasses import FlangMatchObject
+
+
+@dataclasses.dataclass(slots=True)
+class ConstructStats:
+    attempts: int = 0
+    successes: int = 0
+    characters: int = 0  # consumed by successful matches
+    seconds: float = 0.0  # includes time spent matching nested constructs
+    self_seconds: float = 0.0
+
+    @property
+    def failures(self) -> int:
+        return self.attempts - self.successes
+
+    def to_dict(self) -> dict[str, int | float]:
+        return {
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "failures": self.failures,
+            "characters": self.characters,
+            "seconds": self.seconds,
+            "self_seconds": self.self_seconds,
+        }
+
+
+class MatchProfiler:
+    """
+    Collects statistics of every construct of the compiled matcher, keyed by the
+    location of the construct. Matchers are wrapped only when a profiler is given
+    to the compiler, so matching without profiling does not pay anything for it.
+    Time of recursive constructs is counted once for every level of recursion
+    """
+
+    def __init__(self) -> None:
+        self.stats: dict[str, ConstructStats] = {}
+        # time spent in constructs nested in the ones currently being matched
+        self._nested_seconds: list[float] = []
+
+    def _measure(self, stats: ConstructStats, function, *args):
+        nested_seconds, clock = self._nested_seconds, time.perf_counter
+        nested_seconds.append(0.0)
+        start = clock()
+
+        try:
+            return function(*args)
+        finally:
+            elapsed = clock() - start
+            stats.attempts += 1
+            stats.seconds += elapsed
+            stats.self_seconds += elapsed - nested_seconds.pop()
+
+            if nested_seconds:
+                nested_seconds[-1] += elapsed
+
+    def wrap(self, symbol: str, matcher):
+        stats = self.stats.setdefault(symbol, ConstructStats())
+        measure = self._measure
+
+        def profiled_match(text: str, position: int) -> FlangMatchObject | None:
+            if (result := measure(stats, matcher, text, position)) is not None:
+                stats.successes += 1
+                stats.characters += result.end - result.start
+
+            return result
+
+        return profiled_match
+
+    def wrap_step(self, symbol: str, step):
+        stats = self.stats.setdefault(symbol, ConstructStats())
+        measure = self._measure
+
+        def profiled_step(text: str, position: int, spec: dict) -> int | None:
+            if (end := measure(stats, step, text, position, spec)) is not None:
+                stats.successes += 1
+                stats.characters += end - position
+
+            return end
+
+        return profiled_step
+
+    def reset(self) -> None:
+        # wrapped matchers keep references to their stats, so they are cleared in place
+        for stats in self.stats.values():
+            stats.attempts = stats.successes = stats.characters = 0
+            stats.seconds = stats.self_seconds = 0.0
+
+    def most_expensive(self, limit: int | None = None) -> list[tuple[str, ConstructStats]]:
+        """
+        Constructs sorted by the time spent in them, without their nested constructs
+        """
+        ranked = sorted(self.stats.items(), key=lambda item: item[1].self_seconds, reverse=True)
+        return ranked[:limit]
+
+    def report(self, limit: int | None = 20) -> str:
+        lines = [
+            f"{'construct':<48} {'attempts':>9} {'fails':>9} {'chars':>10} "
+            f"{'self ms':>9} {'total ms':>9} {'us/try':>8}"
+        ]
+
+        for symbol, stats in self.most_expensive(limit):
+            per_attempt = stats.self_seconds / stats.attempts * 1e6 if stats.attempts else 0.0
+            lines.append(
+                f"{symbol:<48} {stats.attempts:>9} {stats.failures:>9} {stats.characters:>10} "
+                f"{stats.self_seconds * 1000:>9.3f} {stats.seconds * 1000:>9.3f} {per_attempt:>8.2f}"
+            )
+
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict[str, dict[str, int | float]]:
+        return {symbol: stats.to_dict() for symbol, stats in self.most_expensive()}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
@@ -0,0 +1,217 @@
+from __future__ import annotations
+import collections
+import contextlib
+import heapq
+import sqlite3
+from typing import Iterable
+
+from utils.abstracts import SampleStore
+
+
+class FlangSampleStore(SampleStore):
+    """
+    Samples fed to the generator together with an inverted index
+    from (key, value) pairs to ids of samples containing them
+    """
+
+    def __init__(self) -> None:
+        self.samples: list[dict[str, str]] = []
+        self.index: dict[tuple[str, str], list[int]] = collections.defaultdict(list)
+
+    def add(self, sample: dict[str, str]) -> int:
+        sample_id = len(self.samples)
+        self.samples.append(dict(sample))
+
+        for item in sample.items():
+            self.index[item].append(sample_id)
+
+        return sample_id
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def __getitem__(self, sample_id: int) -> dict[str, str]:
+        return self.samples[sample_id]
+
+    def most_similar(self, spec: dict[str, str], k: int = 1) -> list[tuple[int, int]]:
+        """
+        Returns up to k pairs of (sample id, number of shared key-value pairs), the most
+        similar first. Only samples sharing at least one pair with the spec are visited.
+        Ties are resolved in favour of samples fed earlier
+        """
+        similarities = collections.Counter()
+
+        for item in spec.items():
+            if postings := self.index.get(item):
+                similarities.update(postings)
+
+        if not similarities:
+            return [(sample_id, 0) for sample_id in range(min(k, len(self.samples)))]
+
+        best = heapq.nsmallest(k, similarities.items(), key=lambda pair: (-pair[1], pair[0]))
+        return [(sample_id, similarity) for sample_id, similarity in best]
+
+
+class SQLiteSampleStore(SampleStore):
+    """
+    Sample store persisted in a SQLite database, so the corpus outlives the process
+    and can be shared by many generator processes.
+    Keys and values are interned, a sample is stored as a list of ids of its
+    (key, value) pairs. The database file is memory mapped by SQLite and queried
+    on demand, nothing is loaded up front
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS strings (id INTEGER PRIMARY KEY, value TEXT NOT NULL UNIQUE);
+    CREATE TABLE IF NOT EXISTS pairs (
+        id INTEGER PRIMARY KEY,
+        key_id INTEGER NOT NULL,
+        value_id INTEGER NOT NULL,
+        UNIQUE (key_id, value_id)
+    );
+    CREATE TABLE IF NOT EXISTS samples (id INTEGER PRIMARY KEY);
+    CREATE TABLE IF NOT EXISTS sample_pairs (
+        sample_id INTEGER NOT NULL,
+        pair_id INTEGER NOT NULL,
+        PRIMARY KEY (pair_id, sample_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS sample_pairs_by_sample ON sample_pairs (sample_id);
+    """
+
+    def __init__(self, path: str, mmap_size: int = 1 << 30) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self.connection.executescript(self.SCHEMA)
+        self._in_batch = False
+        # ids of rows never change, so they can be remembered by the process
+        self._pair_ids: dict[tuple[str, str], int] = {}
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Groups many additions into a single transaction
+        """
+        if self._in_batch:
+            yield
+            return
+
+        self._in_batch = True
+        self.connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            self._pair_ids.clear()  # could remember rows that were rolled back
+            raise
+        else:
+            self.connection.execute("COMMIT")
+        finally:
+            self._in_batch = False
+
+    def _intern(self, value: str) -> int:
+        self.connection.execute("INSERT OR IGNORE INTO strings (value) VALUES (?)", (value,))
+        [(string_id,)] = self.connection.execute("SELECT id FROM strings WHERE value = ?", (value,))
+        return string_id
+
+    def _pair_id(self, key: str, value: str, create: bool = False) -> int | None:
+        if (pair_id := self._pair_ids.get((key, value))) is not None:
+            return pair_id
+
+        if create:
+            key_id, value_id = self._intern(key), self._intern(value)
+            self.connection.execute(
+                "INSERT OR IGNORE INTO pairs (key_id, value_id) VALUES (?, ?)", (key_id, value_id)
+            )
+            [(pair_id,)] = self.connection.execute(
+                "SELECT id FROM pairs WHERE key_id = ? AND value_id = ?", (key_id, value_id)
+            )
+            self._pair_ids[key, value] = pair_id
+            return pair_id
+
+        row = self.connection.execute(
+            """
+            SELECT pairs.id FROM pairs
+            JOIN strings AS k ON k.id = pairs.key_id
+            JOIN strings AS v ON v.id = pairs.value_id
+            WHERE k.value = ? AND v.value = ?
+            """,
+            (key, value),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        self._pair_ids[key, value] = row[0]
+        return row[0]
+
+    def add(self, sample: dict[str, str]) -> int:
+        with self.batch():
+            # ids start from 0, the same as in the in memory store
+            sample_id = self.connection.execute(
+                "INSERT INTO samples (id) SELECT COALESCE(MAX(id) + 1, 0) FROM samples RETURNING id"
+            ).fetchone()[0]
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO sample_pairs (sample_id, pair_id) VALUES (?, ?)",
+                [(sample_id, self._pair_id(key, value, create=True)) for key, value in sample.items()],
+            )
+
+        return sample_id
+
+    def add_many(self, samples: Iterable[dict[str, str]]) -> list[int]:
+        with self.batch():
+            return [self.add(sample) for sample in samples]
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+
+    def __getitem__(self, sample_id: int) -> dict[str, str]:
+        if self.connection.execute("SELECT 1 FROM samples WHERE id = ?", (sample_id,)).fetchone() is None:
+            raise IndexError(sample_id)
+
+        return dict(
+            self.connection.execute(
+                """
+                SELECT k.value, v.value FROM sample_pairs
+                JOIN pairs ON pairs.id = sample_pairs.pair_id
+                JOIN strings AS k ON k.id = pairs.key_id
+                JOIN strings AS v ON v.id = pairs.value_id
+                WHERE sample_pairs.sample_id = ?
+                """,
+                (sample_id,),
+            )
+        )
+
+    def most_similar(self, spec: dict[str, str], k: int = 1) -> list[tuple[int, int]]:
+        pair_ids = [
+            pair_id for key, value in spec.items() if (pair_id := self._pair_id(key, value)) is not None
+        ]
+        rows = []
+
+        if pair_ids:
+            rows = self.connection.execute(
+                f"""
+                SELECT sample_id, COUNT(*) AS similarity FROM sample_pairs
+                WHERE pair_id IN ({", ".join("?" * len(pair_ids))})
+                GROUP BY sample_id
+                ORDER BY similarity DESC, sample_id
+                LIMIT ?
+                """,
+                (*pair_ids, k),
+            ).fetchall()
+
+        if not rows:
+            rows = [
+                (sample_id, 0)
+                for (sample_id,) in self.connection.execute(
+                    "SELECT id FROM samples ORDER BY id LIMIT ?", (k,)
+                )
+            ]
+
+        return [(sample_id, similarity) for sample_id, similarity in rows]
@@ -0,0 +1,109 @@
+from __future__ import annotations
+import dataclasses
+import fnmatch
+import os
+from typing import Iterable, Iterator
+
+from flang_parser2 import FlangTextProcessor
+from utils.abstracts import FlangProcessor
+from utils.anchors import mandatory_literals
+from utils.dataclasses import FlangObject
+
+
+def _matches_any(patterns: Iterable[str], relative_path: str, name: str) -> bool:
+    return any(
+        fnmatch.fnmatchcase(relative_path, pattern) or fnmatch.fnmatchcase(name, pattern) for pattern in patterns
+    )
+
+
+def walk_files(root: str, include: Iterable[str] = ("*",), exclude: Iterable[str] = ()) -> Iterator[str]:
+    """
+    Yields paths of files under root in the order of the directory listing.
+    Globs are matched against the path relative to root and against the bare name,
+    excluded directories are not entered at all
+    """
+    include, exclude = tuple(include) or ("*",), tuple(exclude)
+    stack = [root]
+
+    while stack:
+        directory = stack.pop()
+
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+
+        for entry in entries:
+            relative_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+
+            if _matches_any(exclude, relative_path, entry.name):
+                continue
+
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file() and _matches_any(include, relative_path, entry.name):
+                yield entry.path
+
+
+@dataclasses.dataclass
+class ScanResult:
+    path: str
+    size: int = 0
+    records: list[dict] = dataclasses.field(default_factory=list)
+
+
+class FileMatcher(FlangProcessor):
+    """
+    Matches the template against whole files, or every line of them, given their paths.
+    Files are read by the process doing the matching, so only paths and results
+    are sent between processes. Files without all of the mandatory text
+    of the template are not matched at all
+    """
+
+    def __init__(self, flang_object: FlangObject, lines: bool = False, flat: bool = False) -> None:
+        self.processor = FlangTextProcessor(flang_object)
+        self.anchors = tuple(mandatory_literals(flang_object))
+        self.lines = lines
+        self.flat = flat
+
+    def _record(self, path: str, match_object, line: int | None = None) -> dict:
+        record = {"path": path} if line is None else {"path": path, "line": line}
+        record["match"] = match_object.to_flat_dict() if self.flat else match_object.to_dict()
+        return record
+
+    def run(self, path: str) -> ScanResult:
+        result = ScanResult(path)
+
+        try:
+            self._scan(result)
+        except Exception as error:
+            result.records.append({"path": path, "error": f"{type(error).__name__}: {error}"})
+
+        return result
+
+    def _scan(self, result: ScanResult) -> None:
+        with open(result.path, encoding="utf-8", errors="replace") as f:
+            text = f.read()
+
+        result.size = len(text)
+        anchors, run = self.anchors, self.processor.run
+
+        if not all(anchor in text for anchor in anchors):
+            return
+
+        if not self.lines:
+            if (match_object := run(text)) is not None:
+                result.records.append(self._record(result.path, match_object))
+            return
+
+        for number, line in enumerate(text.splitlines(), start=1):
+            if all(anchor in line for anchor in anchors) and (match_object := run(line)) is not None:
+                result.records.append(self._record(result.path, match_object, number))
+
+    @property
+    def input_type(self) -> type:
+        return str
+
+    @property
+    def output_type(self) -> type:
+        return ScanResult
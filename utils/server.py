@@ -0,0 +1,387 @@
+"""
+Long running server keeping parsed templates warm between requests:
+
+    python -m utils.server --socket /tmp/flang.sock
+    python -m utils.server --port 8765 --workers 4
+
+Requests and responses are JSON lines. Every request names the template file
+and the operation, the response carries the id of its request:
+
+    {"id": 1, "op": "match", "template": "lib/import.flang.xml", "sample": "from a import b"}
+    {"id": 1, "result": {"module": "a", "object": "b"}, "error": null}
+
+Operations are "match", "generate" (with "spec" instead of "sample"), "load",
+which only warms the template, and "stats"
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import dataclasses
+import json
+import os
+import pickle
+import sys
+import time
+import warnings
+
+from flang_parser2 import FlangParser, FlangTextProcessor, FlangGenerationProcessor
+from utils.abstracts import FlangProcessor
+from utils.batch import run_chunk
+
+PROCESSOR_CLASSES = {"match": FlangTextProcessor, "generate": FlangGenerationProcessor}
+
+# processors unpickled by the worker process, keyed by (template, operation, version)
+_worker_processors: dict[tuple[str, str, int], FlangProcessor] = {}
+
+
+def _to_json_value(result: any) -> any:
+    return result.to_dict() if hasattr(result, "to_dict") else result
+
+
+def run_batch(processor: FlangProcessor, samples: list) -> list[tuple[any, str | None]]:
+    return [
+        (_to_json_value(batch_result.result), batch_result.error)
+        for batch_result in run_chunk(processor, list(enumerate(samples)))
+    ]
+
+
+def _run_worker_batch(
+    key: tuple[str, str, int], samples: list, payload: bytes | None = None
+) -> list[tuple[any, str | None]] | None:
+    """
+    Returns None when the worker has not loaded this version of the template yet,
+    the server sends the batch again together with the pickled processor
+    """
+    if (processor := _worker_processors.get(key)) is None:
+        if payload is None:
+            return None
+
+        # older versions of the template are not needed anymore
+        for stale_key in [stale for stale in _worker_processors if stale[:2] == key[:2]]:
+            del _worker_processors[stale_key]
+
+        processor = _worker_processors[key] = pickle.loads(payload)
+
+    return run_batch(processor, samples)
+
+
+@dataclasses.dataclass
+class ServedProcessor:
+    key: tuple[str, str, int]
+    processor: FlangProcessor
+    _payload: bytes | None = dataclasses.field(default=None, repr=False)
+
+    @property
+    def payload(self) -> bytes:
+        """
+        Processor is pickled once and sent to every worker only once,
+        later batches carry just the key
+        """
+        if self._payload is None:
+            self._payload = pickle.dumps(self.processor)
+        return self._payload
+
+
+@dataclasses.dataclass
+class PendingRequest:
+    processor: ServedProcessor
+    sample: any
+    future: asyncio.Future
+    received: float
+
+
+class ServerStats:
+    def __init__(self, window: int = 1024) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.in_flight = 0
+        self.latencies: collections.deque[float] = collections.deque(maxlen=window)
+
+    def record_batch(self, size: int) -> None:
+        self.batches += 1
+        self.batched_requests += size
+
+    def record_response(self, received: float, failed: bool) -> None:
+        self.requests += 1
+        self.errors += failed
+        self.latencies.append(time.perf_counter() - received)
+
+    def to_dict(self, queued: int, templates: int) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction: float) -> float | None:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "queued": queued,
+            "in_flight_batches": self.in_flight,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0,
+            "templates": templates,
+            "latency_ms": {"p50": percentile(0.5), "p99": percentile(0.99), "max": percentile(1.0)},
+        }
+
+
+class FlangServer:
+    """
+    Serves match and generate requests with templates kept parsed in memory.
+    Concurrent requests are coalesced into batches of at most max_batch samples
+    of the same template and operation. While other batches are running, a batch
+    waits up to max_delay seconds for more requests.
+    With workers, batches are run in a pool of processes, otherwise in the
+    thread of the event loop, which is faster for small templates.
+    With watch_interval, loaded templates are reloaded when their files change
+    """
+
+    def __init__(
+        self,
+        parser: FlangParser | None = None,
+        workers: int = 0,
+        max_batch: int = 256,
+        max_delay: float = 0.001,
+        watch_interval: float | None = None,
+    ) -> None:
+        self.parser = parser or FlangParser()
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.watch_interval = watch_interval
+        self.processors: dict[tuple[str, str], ServedProcessor] = {}
+        self.versions: collections.Counter[str] = collections.Counter()
+        self.stats = ServerStats()
+        self.executor: concurrent.futures.ProcessPoolExecutor | None = None
+        self.queue: asyncio.Queue[PendingRequest] | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    def processor_for(self, template: str, operation: str) -> ServedProcessor:
+        template = os.path.abspath(template)
+
+        if (served := self.processors.get((template, operation))) is None:
+            if template not in self.parser.flang_objects:
+                self.parser.parse_file(template)
+
+            processor = PROCESSOR_CLASSES[operation](self.parser.flang_objects[template])
+            served = ServedProcessor((template, operation, self.versions[template]), processor)
+            self.processors[template, operation] = served
+
+        return served
+
+    def invalidate(self, path: str, error: Exception | None = None) -> None:
+        if error is not None:
+            warnings.warn(f"Cannot reload {path}: {error}")
+            return
+
+        for template in [path, *self.parser.dependents(path)]:
+            self.versions[template] += 1
+
+            for operation in PROCESSOR_CLASSES:
+                self.processors.pop((template, operation), None)
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue()
+
+        if self.workers:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+
+        self._tasks.append(asyncio.create_task(self._batch_requests()))
+
+        if self.watch_interval:
+            self._tasks.append(asyncio.create_task(self._watch()))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    async def __aenter__(self) -> FlangServer:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+    async def handle(self, request: dict) -> dict:
+        received = time.perf_counter()
+        response = {"id": request.get("id"), "result": None, "error": None}
+        operation = request.get("op", "match")
+
+        try:
+            if operation == "stats":
+                response["result"] = self.stats.to_dict(self.queue.qsize(), len(self.parser.flang_objects))
+                return response
+
+            if operation == "load":
+                self.processor_for(request["template"], "match")
+                response["result"] = True
+                return response
+
+            if operation not in PROCESSOR_CLASSES:
+                raise ValueError(f"Unknown operation {operation}")
+
+            served = self.processor_for(request["template"], operation)
+            sample = request["sample"] if operation == "match" else request["spec"]
+        except Exception as error:
+            response["error"] = f"{type(error).__name__}: {error}"
+            self.stats.record_response(received, failed=True)
+            return response
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(PendingRequest(served, sample, future, received))
+        response["result"], response["error"] = await future
+        self.stats.record_response(received, failed=response["error"] is not None)
+        return response
+
+    async def _next_batch(self) -> list[PendingRequest]:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_delay
+        await asyncio.sleep(0)  # lets requests already read from the sockets join the batch
+
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+
+            # idle server answers right away, waiting only pays off when batches queue up
+            if not self.stats.in_flight or (timeout := deadline - loop.time()) <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _batch_requests(self) -> None:
+        running: set[asyncio.Task] = set()
+
+        while True:
+            groups: dict[tuple[str, str, int], list[PendingRequest]] = collections.defaultdict(list)
+
+            for pending in await self._next_batch():
+                groups[pending.processor.key].append(pending)
+
+            for group in groups.values():
+                task = asyncio.create_task(self._run_group(group))
+                running.add(task)
+                task.add_done_callback(running.discard)
+
+    async def _run_group(self, group: list[PendingRequest]) -> None:
+        served, samples = group[0].processor, [pending.sample for pending in group]
+        self.stats.record_batch(len(group))
+        self.stats.in_flight += 1
+
+        try:
+            if self.executor is None:
+                results = run_batch(served.processor, samples)
+            else:
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(self.executor, _run_worker_batch, served.key, samples)
+
+                if results is None:
+                    results = await loop.run_in_executor(
+                        self.executor, _run_worker_batch, served.key, samples, served.payload
+                    )
+        except Exception as error:
+            results = [(None, f"{type(error).__name__}: {error}")] * len(group)
+        finally:
+            self.stats.in_flight -= 1
+
+        for pending, result in zip(group, results):
+            if not pending.future.done():
+                pending.future.set_result(result)
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            self.parser.poll_changes(self.invalidate)
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        responding: set[asyncio.Task] = set()
+
+        async def respond(line: bytes):
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                response = {"id": None, "result": None, "error": f"ValueError: {error}"}
+            else:
+                response = await self.handle(request)
+
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+        try:
+            # requests of a connection are handled concurrently, so they can share a batch
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(respond(line))
+                    responding.add(task)
+                    task.add_done_callback(responding.discard)
+
+            await asyncio.gather(*responding)
+        finally:
+            writer.close()
+
+    async def serve_unix(self, path: str) -> asyncio.AbstractServer:
+        return await asyncio.start_unix_server(self._serve_connection, path, limit=1 << 24)
+
+    async def serve_tcp(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._serve_connection, host, port, limit=1 << 24)
+
+
+async def serve(options: argparse.Namespace) -> None:
+    parser = FlangParser(use_cache=options.cache_directory is not None, cache_directory=options.cache_directory)
+
+    async with FlangServer(
+        parser, options.workers, options.max_batch, options.max_delay / 1000, options.watch
+    ) as server:
+        for template in options.template or []:
+            server.processor_for(template, "match")
+
+        if options.socket:
+            listener = await server.serve_unix(options.socket)
+        else:
+            listener = await server.serve_tcp(options.host, options.port)
+
+        async with listener:
+            await listener.serve_forever()
+
+
+def main(argv: list[str] | None = None) -> int:
+    arguments = argparse.ArgumentParser(prog="python -m utils.server")
+    arguments.add_argument("--socket", help="listen on this unix socket instead of tcp")
+    arguments.add_argument("--host", default="127.0.0.1")
+    arguments.add_argument("--port", type=int, default=8765)
+    arguments.add_argument("--workers", type=int, default=0, help="size of the process pool, 0 runs in the server")
+    arguments.add_argument("--max-batch", type=int, default=256)
+    arguments.add_argument("--max-delay", type=float, default=1.0, help="milliseconds to wait for a batch")
+    arguments.add_argument("--watch", type=float, help="seconds between checks of template files")
+    arguments.add_argument("--cache-directory")
+    arguments.add_argument("--template", action="append", help="template loaded on start")
+    options = arguments.parse_args(argv)
+
+    try:
+        asyncio.run(serve(options))
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
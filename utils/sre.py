@@ -0,0 +1,11 @@
+"""
+Parser of the regular expression engine, used to look into predicate patterns.
+It is private to the re module and was renamed in python 3.11
+"""
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # python < 3.11
+    import sre_parse
+    import sre_constants
+
+__all__ = ["sre_parse", "sre_constants"]
@@ -0,0 +1,269 @@
+"""
+Front-end for templates written in the surface syntax:
+
+    document := (text | block)*
+    block    := "{%" directive head body "%}"
+    head     := (param | positional)*
+    param    := "^" key value
+    value    := word | string | list | block
+    list     := "[" (word | string)* "]"
+
+Every directive has a fixed list of positional slots in its head. Whatever follows
+the head up to the closing "%}" is the body. Whitespace around the body and
+whitespace spanning lines between blocks is only layout of the template.
+Text outside of the top level blocks, like samples written below the template,
+is not a part of the template
+"""
+from __future__ import annotations
+import bisect
+import dataclasses
+import re
+import textwrap
+
+from utils.abstracts import TextToIntermediateTreeParser
+from utils.dataclasses import IntermediateFlangTreeElement, SourcePosition
+from utils.patterns import PATTERNS
+
+BLOCK_BOUNDARY = re.compile(r"\{%|%\}")
+DIRECTIVE_NAME = re.compile(r"\s*([\w-]+)")
+WHITESPACE = re.compile(r"\s*")
+CLOSE = re.compile(r"\s*%\}")
+LIST_END = re.compile(r"\s*\]")
+# one token of the head of a block, kind of the token is the name of the matched group
+HEAD_TOKEN = re.compile(
+    r"""\s*(?:
+        \^(?P<key>[\w-]+)
+        | (?P<close>%\})
+        | (?P<block>\{%)
+        | "(?P<string>(?:[^"\\]|\\.)*)"
+        | (?P<list>\[)
+        | (?P<word>(?:(?!%\})[^\s\[\]"])+)
+    )""",
+    re.VERBOSE | re.DOTALL,
+)
+
+
+class FlangSyntaxError(ValueError):
+    def __init__(self, message: str, position: SourcePosition) -> None:
+        super().__init__(f"{message} at line {position.line}, column {position.column}")
+        self.position = position
+
+
+@dataclasses.dataclass(frozen=True)
+class Directive:
+    element: str | None  # directives without element evaluate to a value
+    slots: tuple[str, ...] = ()
+    body: str | None = "template"  # "template", "verbatim" or None
+    attributes: dict[str, str] = dataclasses.field(default_factory=dict)
+    defaults: dict[str, str] = dataclasses.field(default_factory=dict)
+
+
+COMPONENT = Directive("component", ("name",))
+PREDICATE = Directive("predicate", ("name", "pattern"), body=None, defaults={"pattern": "{vname}"})
+REFERENCE = Directive("use", ("ref",), body=None)
+
+DIRECTIVES = {
+    "defc": COMPONENT,
+    "defm": COMPONENT,
+    "defmc": COMPONENT,
+    "defpc": Directive("component", ("name",), attributes={"type": "definition"}),
+    "defrpe": Directive("component", ("name",), attributes={"prod-rule": "?"}),
+    "defoc": Directive("choice", ("name",)),
+    "defp": PREDICATE,
+    "defv": PREDICATE,
+    "defmp": PREDICATE,
+    "use": REFERENCE,
+    "usem": REFERENCE,
+    "uselm": REFERENCE,
+    "useem": REFERENCE,
+    "defr": Directive("rule", ("name",), body="verbatim"),
+    "format": Directive(None, ("value",), body=None),
+}
+
+
+def is_layout(text: str) -> bool:
+    return not text or (text.isspace() and "\n" in text)
+
+
+class _SurfaceReader:
+    """
+    Single pass over the text, the recursive descent parser drives the tokenizer,
+    because what a token is depends on whether the head or the body of a block is read
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.pos = 0
+        self.line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+
+    def position(self, offset: int) -> SourcePosition:
+        line = bisect.bisect_right(self.line_starts, offset)
+        return SourcePosition(line, offset - self.line_starts[line - 1])
+
+    def error(self, message: str, offset: int | None = None) -> FlangSyntaxError:
+        return FlangSyntaxError(message, self.position(self.pos if offset is None else offset))
+
+    def parse_document(self) -> IntermediateFlangTreeElement:
+        blocks = []
+
+        while match := BLOCK_BOUNDARY.search(self.text, self.pos):
+            if match.group() == "%}":
+                raise self.error("Unexpected %}", match.start())
+
+            self.pos = match.start()
+
+            if isinstance(block := self.parse_block(), str):
+                raise self.error("Value cannot be used outside of a block", match.start())
+            blocks.append(block)
+
+        if not blocks:
+            raise self.error("Template does not define any component", 0)
+
+        if len(blocks) == 1:
+            return blocks[0]
+
+        return IntermediateFlangTreeElement("component", blocks, {}, position=blocks[0].position)
+
+    def parse_block(self) -> IntermediateFlangTreeElement | str:
+        text, start = self.text, self.pos
+
+        if not (match := DIRECTIVE_NAME.match(text, start + 2)):
+            raise self.error("Expected name of the directive", start + 2)
+        if (directive := DIRECTIVES.get(match.group(1))) is None:
+            raise self.error(f"Unknown directive {match.group(1)}", match.start(1))
+
+        self.pos = match.end()
+        attributes = dict(directive.attributes)
+        slots = list(directive.slots)
+
+        while token := HEAD_TOKEN.match(text, self.pos):
+            kind = token.lastgroup
+
+            if kind == "key":
+                self.pos = token.end()
+                attributes[token.group("key")] = self.parse_value()
+                continue
+
+            if "names" in attributes or "refname" in attributes:
+                attributes.setdefault("name", attributes.get("refname") or attributes["names"].split(",")[0])
+
+            slots = [slot for slot in slots if slot not in attributes]
+
+            # names are always words, a quoted pattern of a predicate skips the name
+            if slots and slots[0] == "name" and kind != "word" and directive.body is None:
+                slots.pop(0)
+
+            # in a block with body, only a word can be positional, anything else starts the body
+            if not slots or kind == "close" or (directive.body is not None and kind != "word"):
+                break
+
+            slot, value = slots.pop(0), self.parse_value()
+            attributes[slot] = f"{{{value}}}" if slot == "pattern" and value in PATTERNS.named else value
+
+        if directive.body == "template":
+            children = self.parse_body(start)
+        elif directive.body == "verbatim":
+            if (end := text.find("%}", self.pos)) == -1:
+                raise self.error("Block is not closed", start)
+
+            code = textwrap.dedent(text[self.pos : end]).strip("\n")
+            children = [IntermediateFlangTreeElement("text", code, position=self.position(self.pos))]
+            self.pos = end + 2
+        else:
+            if not (token := CLOSE.match(text, self.pos)):
+                raise self.error("Expected %}", WHITESPACE.match(text, self.pos).end())
+
+            self.pos = token.end()
+            children = []
+
+        if directive.element is None:
+            return attributes["value"]
+
+        for attribute, value in directive.defaults.items():
+            attributes.setdefault(attribute, value)
+
+        if directive.element == "use":
+            attributes["ref"] = self.qualify_reference(attributes)
+
+        return IntermediateFlangTreeElement(directive.element, children, attributes, position=self.position(start))
+
+    def parse_body(self, start: int) -> list[IntermediateFlangTreeElement]:
+        children = []
+
+        while True:
+            if (match := BLOCK_BOUNDARY.search(self.text, self.pos)) is None:
+                raise self.error("Block is not closed", start)
+
+            if match.start() > self.pos:
+                children.append(
+                    IntermediateFlangTreeElement(
+                        "text", self.text[self.pos : match.start()], position=self.position(self.pos)
+                    )
+                )
+
+            if match.group() == "%}":
+                self.pos = match.end()
+                break
+
+            self.pos = match.start()
+            child = self.parse_block()
+
+            if isinstance(child, str):
+                child = IntermediateFlangTreeElement("text", child, position=self.position(match.start()))
+            children.append(child)
+
+        # indentation around the body only formats the template
+        if children and children[0].name == "text":
+            children[0].value = children[0].value.lstrip()
+        if children and children[-1].name == "text":
+            children[-1].value = children[-1].value.rstrip()
+
+        return [child for child in children if child.name != "text" or not is_layout(child.value)]
+
+    def parse_value(self) -> str:
+        token = HEAD_TOKEN.match(self.text, self.pos)
+        kind = token and token.lastgroup
+
+        if kind == "block":
+            start = self.pos = token.start(kind)
+
+            if not isinstance(value := self.parse_block(), str):
+                raise self.error("Expected a value, got a block", start)
+            return value
+
+        if kind == "string" or kind == "word":
+            self.pos = token.end()
+            return token.group(kind).replace('\\"', '"')
+
+        if kind == "list":
+            self.pos = token.end()
+            items = []
+
+            while (token := HEAD_TOKEN.match(self.text, self.pos)) and token.lastgroup in ("string", "word"):
+                self.pos = token.end()
+                items.append(token.group(token.lastgroup).replace('\\"', '"'))
+
+            if not (token := LIST_END.match(self.text, self.pos)):
+                raise self.error("List is not closed")
+
+            self.pos = token.end()
+            return ",".join(items)
+
+        raise self.error("Expected a value", WHITESPACE.match(self.text, self.pos).end())
+
+    @staticmethod
+    def qualify_reference(attributes: dict[str, str]) -> str:
+        reference = attributes["ref"]
+
+        if path := attributes.pop("path", None):
+            return f"{path}:{reference}"
+
+        if reference.startswith(".") or ":" in reference:
+            return reference
+
+        return f".{reference}"
+
+
+class FlangSurfaceParser(TextToIntermediateTreeParser):
+    def parse(self, text: str) -> IntermediateFlangTreeElement:
+        return _SurfaceReader(text).parse_document()
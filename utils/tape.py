@@ -0,0 +1,109 @@
+from __future__ import annotations
+import array
+import json
+
+from utils.dataclasses import FlangMatchObject, RecursiveDict
+
+ROOT_PARENT = -1
+
+
+class FlangMatchTape:
+    """
+    Match stored as a flat tape of nodes in preorder, kept in parallel arrays.
+    Parent of every node comes before it on the tape, so all of the conversions
+    are done in a single linear pass. Pickled tape is just a few byte buffers
+    """
+
+    __slots__ = ("source", "symbols", "symbol_ids", "parents", "starts", "ends", "leaves")
+
+    def __init__(self, source: str, symbols: list[str] | None = None) -> None:
+        self.source = source
+        self.symbols: list[str] = symbols if symbols is not None else []
+        self.symbol_ids = array.array("l")
+        self.parents = array.array("l")
+        self.starts = array.array("l")
+        self.ends = array.array("l")
+        self.leaves = array.array("b")
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getstate__(self):
+        columns = (self.symbol_ids, self.parents, self.starts, self.ends, self.leaves)
+        return self.source, self.symbols, tuple(column.tobytes() for column in columns)
+
+    def __setstate__(self, state):
+        self.source, self.symbols, buffers = state
+        self.symbol_ids, self.parents, self.starts, self.ends, self.leaves = (
+            array.array(typecode, buffer) for typecode, buffer in zip("llllb", buffers)
+        )
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FlangMatchTape) and self.__getstate__() == other.__getstate__()
+
+    def append(self, symbol_id: int, parent: int, start: int, end: int, leaf: bool) -> int:
+        self.symbol_ids.append(symbol_id)
+        self.parents.append(parent)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.leaves.append(leaf)
+        return len(self.starts) - 1
+
+    @classmethod
+    def from_match_object(cls, match_object: FlangMatchObject) -> FlangMatchTape:
+        tape = cls(match_object.source)
+        symbol_ids: dict[str, int] = {}
+        stack = [(ROOT_PARENT, ROOT_PARENT, match_object)]
+
+        while stack:
+            symbol_id, parent, node = stack.pop()
+            idx = tape.append(symbol_id, parent, node.start, node.end, node.spec is None)
+
+            if node.spec is None:
+                continue
+
+            for key, child in reversed(node.spec.items()):
+                if key not in symbol_ids:
+                    symbol_ids[key] = len(tape.symbols)
+                    tape.symbols.append(key)
+
+                stack.append((symbol_ids[key], idx, child))
+
+        return tape
+
+    def to_dict(self) -> RecursiveDict | str:
+        source, symbols = self.source, self.symbols
+        values: list = [None] * len(self)
+
+        for idx, (symbol_id, parent, start, end, leaf) in enumerate(
+            zip(self.symbol_ids, self.parents, self.starts, self.ends, self.leaves)
+        ):
+            values[idx] = source[start:end] if leaf else {}
+
+            if parent != ROOT_PARENT:
+                values[parent][symbols[symbol_id]] = values[idx]
+
+        return values[0] if values else {}
+
+    def to_flat_dict(self) -> dict[str, str]:
+        source, symbols = self.source, self.symbols
+        paths: list[str] = [""] * len(self)
+        flat_dict = {}
+
+        for idx, (symbol_id, parent, start, end, leaf) in enumerate(
+            zip(self.symbol_ids, self.parents, self.starts, self.ends, self.leaves)
+        ):
+            if parent == ROOT_PARENT:
+                continue
+
+            path = paths[idx] = (
+                f"{paths[parent]}.{symbols[symbol_id]}" if paths[parent] else symbols[symbol_id]
+            )
+
+            if leaf:
+                flat_dict[path] = source[start:end]
+
+        return flat_dict
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())